@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+import argparse
+import datetime
+import sqlite3
+import time
+from profiling import add_profile_arguments, start_profiling
+import numpy as np
+from approval_client import ApprovalClient
+
+STATUS_CODES = {'pending': 0, 'approved': 1, 'rejected': 2}
+STATUS_NAMES = {code: name for name, code in STATUS_CODES.items()}
+
+BUCKETS = {
+    'hour': 3600 * 1_000_000,
+    'day': 86400 * 1_000_000,
+    'week': 7 * 86400 * 1_000_000,
+}
+
+MISSING = -1
+
+
+def _micros(value):
+    if value is None:
+        return MISSING
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return int(value.timestamp() * 1_000_000)
+
+
+class ColumnarApprovals:
+    def __init__(self, capacity=65536):
+        """
+        Approval requests held as compact columns instead of per-document dicts.
+
+        Requesters and titles are stored as int32 codes into a category table,
+        statuses as int8 codes and timestamps as int64 microseconds since the
+        epoch (-1 when missing). Columns grow geometrically as chunks are
+        appended, so memory is a few dozen bytes per request.
+
+        Args:
+            capacity: Initial number of rows to allocate
+        """
+        self.size = 0
+        self.requesters = {}
+        self.titles = {}
+        self.requester = np.empty(capacity, dtype=np.int32)
+        self.title = np.empty(capacity, dtype=np.int32)
+        self.status = np.empty(capacity, dtype=np.int8)
+        self.created = np.empty(capacity, dtype=np.int64)
+        self.decided = np.empty(capacity, dtype=np.int64)
+
+    def _reserve(self, extra):
+        needed = self.size + extra
+        capacity = len(self.created)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in ('requester', 'title', 'status', 'created', 'decided'):
+            column = getattr(self, name)
+            grown = np.empty(capacity, dtype=column.dtype)
+            grown[:self.size] = column[:self.size]
+            setattr(self, name, grown)
+
+    @staticmethod
+    def _encode(table, values):
+        return np.fromiter((table.setdefault(value, len(table)) for value in values),
+                           dtype=np.int32, count=len(values))
+
+    def append_chunk(self, requesters, titles, statuses, created, decided):
+        """
+        Append one chunk of rows given as parallel sequences.
+
+        Args:
+            requesters: Requester IDs
+            titles: Request titles (used as the category)
+            statuses: Status strings
+            created: createdAt in microseconds (-1 if missing)
+            decided: Decision time in microseconds (-1 if pending or unknown)
+        """
+        n = len(created)
+        if n == 0:
+            return
+        self._reserve(n)
+        end = self.size + n
+        self.requester[self.size:end] = self._encode(self.requesters, requesters)
+        self.title[self.size:end] = self._encode(self.titles, titles)
+        self.status[self.size:end] = np.fromiter(
+            (STATUS_CODES.get(status, MISSING) for status in statuses), dtype=np.int8, count=n
+        )
+        self.created[self.size:end] = np.asarray(created, dtype=np.int64)
+        self.decided[self.size:end] = np.asarray(decided, dtype=np.int64)
+        self.size = end
+
+    def decision_latency(self):
+        """
+        Latency in seconds for every decided request with both timestamps, plus
+        the row index of each value.
+        """
+        created = self.created[:self.size]
+        decided = self.decided[:self.size]
+        mask = (created != MISSING) & (decided != MISSING) & (decided >= created)
+        rows = np.nonzero(mask)[0]
+        return (decided[rows] - created[rows]) / 1e6, rows
+
+
+def load_from_mirror(path, chunk_size=50000):
+    """
+    Load columns from the local SQLite mirror (see sync_approvals.py), chunk by chunk.
+
+    The decision time is `decidedAt` when the mirror has it, otherwise the
+    document's last update time for decided requests.
+    """
+    data = ColumnarApprovals()
+    conn = sqlite3.connect(path)
+    try:
+        cursor = conn.execute(
+            'SELECT requester_id, title, status, created_at, decided_at, update_time FROM approvals'
+        )
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            requesters, titles, statuses, created, decided_at, updated = zip(*rows)
+            decided = []
+            for status, decided_time, update in zip(statuses, decided_at, updated):
+                decided_time = decided_time if decided_time is not None else update
+                decided.append(MISSING if status == 'pending' or decided_time is None
+                               else decided_time)
+            data.append_chunk(requesters, titles, statuses,
+                              [MISSING if value is None else value for value in created],
+                              decided)
+    finally:
+        conn.close()
+    return data
+
+
+def load_from_firestore(client, chunk_size=5000):
+    """
+    Stream columns from Firestore in pages, reading only the fields needed.
+
+    The decision time is `decidedAt` when present, otherwise the document's
+    last update time for decided requests.
+    """
+    data = ColumnarApprovals()
+    fields = ['requesterId', 'title', 'status', 'createdAt', 'decidedAt']
+    query = client.db.collection('approvals').select(fields).order_by('__name__').limit(chunk_size)
+    last = None
+    while True:
+        page = query.start_after(last) if last is not None else query
+        snapshots = list(page.stream())
+        if not snapshots:
+            break
+        requesters, titles, statuses, created, decided = [], [], [], [], []
+        for snapshot in snapshots:
+            doc = snapshot.to_dict()
+            status = doc.get('status', 'pending')
+            requesters.append(doc.get('requesterId', ''))
+            titles.append(doc.get('title', ''))
+            statuses.append(status)
+            created.append(_micros(doc.get('createdAt')))
+            if status == 'pending':
+                decided.append(MISSING)
+            else:
+                decided.append(_micros(doc.get('decidedAt') or snapshot.update_time))
+        data.append_chunk(requesters, titles, statuses, created, decided)
+        last = snapshots[-1]
+        if len(snapshots) < chunk_size:
+            break
+    return data
+
+
+def latency_percentiles(latency, points=(50, 90, 95, 99)):
+    if len(latency) == 0:
+        return {}
+    values = np.percentile(latency, points)
+    return {f"p{point}": float(value) for point, value in zip(points, values)}
+
+
+def group_latency(data, by='requester', points=(50, 90, 99)):
+    """
+    Per-group decision counts, mean and percentile latencies.
+
+    The latencies are sorted once by (group, latency); each group's percentiles
+    are then read straight out of its contiguous slice by index arithmetic.
+
+    Args:
+        data: ColumnarApprovals
+        by: 'requester' or 'title'
+        points: Percentiles to compute
+
+    Returns:
+        List of dicts sorted by decision count, descending
+    """
+    latency, rows = data.decision_latency()
+    table = data.requesters if by == 'requester' else data.titles
+    codes = (data.requester if by == 'requester' else data.title)[rows]
+    names = np.empty(len(table), dtype=object)
+    for name, code in table.items():
+        names[code] = name
+
+    order = np.lexsort((latency, codes))
+    codes, latency = codes[order], latency[order]
+    counts = np.bincount(codes, minlength=len(table))
+    sums = np.bincount(codes, weights=latency, minlength=len(table))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    present = np.nonzero(counts)[0]
+    results = {int(code): {'group': names[code], 'decided': int(counts[code]),
+                           'mean': float(sums[code] / counts[code])} for code in present}
+    for point in points:
+        # Nearest-rank index inside each group's slice
+        offsets = np.ceil(point / 100 * counts[present]).astype(np.int64) - 1
+        values = latency[starts[present] + np.clip(offsets, 0, None)]
+        for code, value in zip(present, values):
+            results[int(code)][f"p{point}"] = float(value)
+    return sorted(results.values(), key=lambda item: item['decided'], reverse=True)
+
+
+def throughput(data, bucket='day'):
+    """
+    Requests created and decided per time bucket.
+
+    Returns:
+        List of (bucket start datetime, created count, decided count)
+    """
+    width = BUCKETS[bucket]
+    created = data.created[:data.size]
+    decided = data.decided[:data.size]
+    created = created[created != MISSING]
+    decided = decided[decided != MISSING]
+    if len(created) == 0 and len(decided) == 0:
+        return []
+    origin = min(created.min() if len(created) else decided.min(),
+                 decided.min() if len(decided) else created.min())
+    origin -= origin % width
+    created_counts = np.bincount((created - origin) // width)
+    decided_counts = np.bincount((decided - origin) // width)
+    length = max(len(created_counts), len(decided_counts))
+    created_counts = np.pad(created_counts, (0, length - len(created_counts)))
+    decided_counts = np.pad(decided_counts, (0, length - len(decided_counts)))
+    return [
+        (datetime.datetime.fromtimestamp((origin + i * width) / 1e6, tz=datetime.timezone.utc),
+         int(created_counts[i]), int(decided_counts[i]))
+        for i in range(length)
+    ]
+
+
+def _format_seconds(value):
+    if value < 120:
+        return f"{value:.0f}s"
+    if value < 7200:
+        return f"{value / 60:.1f}m"
+    return f"{value / 3600:.1f}h"
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Decision-latency analytics for approval requests')
+    parser.add_argument('--credentials', default='./service-account-key.json',
+                        help='Path to Firebase credentials JSON file')
+    parser.add_argument('--db',
+                        help='Read from this local SQLite mirror instead of Firestore')
+    parser.add_argument('--group-by', choices=['requester', 'title'], default='requester',
+                        help='Group latency statistics by requester or title (category)')
+    parser.add_argument('--bucket', choices=sorted(BUCKETS), default='day',
+                        help='Time bucket for throughput')
+    parser.add_argument('--chunk-size', type=int, default=5000,
+                        help='Documents loaded per chunk')
+
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    start_profiling(args)
+
+    try:
+        start = time.perf_counter()
+        if args.db:
+            data = load_from_mirror(args.db, chunk_size=args.chunk_size)
+        else:
+            client = ApprovalClient(args.credentials)
+            data = load_from_firestore(client, chunk_size=args.chunk_size)
+        print(f"Loaded {data.size} requests in {time.perf_counter() - start:.2f}s")
+
+        statuses, counts = np.unique(data.status[:data.size], return_counts=True)
+        print("Status counts: " + ", ".join(
+            f"{STATUS_NAMES.get(int(status), 'unknown')}={count}"
+            for status, count in zip(statuses, counts)))
+
+        latency, _rows = data.decision_latency()
+        overall = latency_percentiles(latency)
+        print(f"\nDecision latency over {len(latency)} decided requests: " + "  ".join(
+            f"{name}={_format_seconds(value)}" for name, value in overall.items()))
+
+        print(f"\nBy {args.group_by}:")
+        for group in group_latency(data, by=args.group_by):
+            print(f"  {str(group['group'])[:30]:<30} decided={group['decided']:<7} "
+                  f"mean={_format_seconds(group['mean']):<7} p50={_format_seconds(group['p50']):<7} "
+                  f"p90={_format_seconds(group['p90']):<7} p99={_format_seconds(group['p99'])}")
+
+        print(f"\nThroughput per {args.bucket}:")
+        for bucket_start, created, decided in throughput(data, args.bucket):
+            print(f"  {bucket_start.isoformat()}  created={created:<6} decided={decided}")
+
+    except Exception as e:
+        print(f"Error: {e}")
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
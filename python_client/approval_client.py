@@ -1,19 +1,111 @@
-import firebase_admin
-from firebase_admin import credentials, firestore
+# Imported first so that --profile can time the imports below
+from profiling import add_profile_arguments, profile_phase, profiling_active, start_profiling
 import argparse
 import datetime
+import functools
+import inspect
 import os
 import json
+import random
+import time
+import uuid
+from collections import namedtuple
+from deadlines import Deadline, DeadlineExceeded, HedgedCaller
+from operation_trace import TraceRecorder
+
+TRANSPORTS = ('grpc', 'rest')
+
+# The gRPC-based Firebase stack takes hundreds of milliseconds to import, so it
+# is only loaded once a client using the grpc transport is created
+firebase_admin = credentials = firestore = google_exceptions = Retry = None
+
+def _load_grpc_stack():
+    global firebase_admin, credentials, firestore, google_exceptions, Retry
+    if Retry is not None:
+        return
+    with profile_phase('imports'):
+        import firebase_admin
+        from firebase_admin import credentials, firestore
+        from google.api_core import exceptions as google_exceptions
+        from google.api_core.retry import Retry
+
+# A claim on a pending request held by one worker until expires_at
+Lease = namedtuple('Lease', ['request_id', 'token', 'worker_id', 'expires_at', 'data'])
+
+class LeaseLostError(Exception):
+    """Raised when a lease has expired or been claimed by another worker."""
+
+def _traced(op, describe=None):
+    """
+    Record calls to a client method in the client's trace, if tracing is enabled,
+    and book their time to the 'rpc' phase when profiling.
+    
+    Args:
+        op: Operation type written to the trace
+        describe: Optional function (arguments, result) -> (document key, payload size)
+    """
+    def decorator(method):
+        signature = inspect.signature(method)
+        
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with profile_phase('rpc'):
+                recorder = self.trace
+                if recorder is None:
+                    return method(self, *args, **kwargs)
+                started = time.perf_counter()
+                result, ok = None, False
+                try:
+                    result = method(self, *args, **kwargs)
+                    ok = True
+                    return result
+                finally:
+                    key, size = None, 0
+                    if describe is not None:
+                        arguments = signature.bind(self, *args, **kwargs).arguments
+                        key, size = describe(arguments, result)
+                    recorder.record(op, started, time.perf_counter() - started, ok, key, size)
+        return wrapper
+    return decorator
+
+def _payload_size(*values):
+    return sum(len(str(value).encode('utf-8')) for value in values)
 
 class ApprovalClient:
-    def __init__(self, credentials_path=None):
+    def __init__(self, credentials_path=None, app_name=None, database=None, trace_path=None,
+                 timeout=None, hedge=False, spool_path=None, spool_flush=True, transport='grpc'):
         """
         Initialize the ApprovalClient with Firebase credentials.
         
         Args:
             credentials_path: Path to the Firebase service account JSON file.
                               If None, looks for FIREBASE_CREDENTIALS_PATH env variable.
+            app_name: Name of the Firebase app to initialize. Use distinct names to
+                      connect to several projects from one process. Defaults to the
+                      default app.
+            database: Named Firestore database to use. Defaults to "(default)".
+            trace_path: If set, record a trace of every operation to this file
+                        (see replay_trace.py).
+            timeout: Default time limit in seconds for each operation. A deadline
+                     passed to an individual call can only shorten it.
+            hedge: Send a backup read when a status check is slower than the
+                   observed p95 and use whichever answers first.
+            spool_path: Enable write-behind mode: new requests are appended to this
+                        local spool file and get a client-assigned ID immediately.
+            spool_flush: Drain the spool into Firestore from a background thread.
+                         Set to False to leave draining to `spool_requests.py flush`.
+            transport: 'grpc' (firebase_admin) or 'rest'. The REST transport starts
+                       much faster, which suits one-shot commands, but only
+                       supports creating, reading and listing requests; `db` is
+                       None with it.
         """
+        if transport not in TRANSPORTS:
+            raise ValueError(f"Unknown transport {transport}; use one of {', '.join(TRANSPORTS)}")
+        if transport == 'rest' and spool_path and spool_flush:
+            raise ValueError("Flushing the spool needs the grpc transport; pass spool_flush=False")
+        self.trace = TraceRecorder(trace_path) if trace_path else None
+        self.timeout = timeout
+        self.hedger = HedgedCaller() if hedge else None
         if credentials_path is None:
             credentials_path = os.environ.get('FIREBASE_CREDENTIALS_PATH')
             if credentials_path is None:
@@ -22,16 +114,96 @@ class ApprovalClient:
                     "or set the FIREBASE_CREDENTIALS_PATH environment variable."
                 )
         
+        self.db = None
+        self.rest = None
+        if transport == 'rest':
+            with profile_phase('imports'):
+                from rest_transport import FirestoreRestClient
+            with profile_phase('credentials'):
+                self.rest = FirestoreRestClient.from_service_account(credentials_path, database)
+            print("Using the Firestore REST API")
+        else:
+            self._connect(credentials_path, app_name, database)
+        
+        self.spool = None
+        self.flusher = None
+        if spool_path:
+            # The spool locks with fcntl, so it is only imported when used
+            from request_spool import RequestSpool, SpoolFlusher
+            self.spool = RequestSpool(spool_path)
+            if spool_flush:
+                self.flusher = SpoolFlusher(self.spool, self.db)
+    
+    def _connect(self, credentials_path, app_name, database):
+        _load_grpc_stack()
         try:
-            cred = credentials.Certificate(credentials_path)
-            firebase_admin.initialize_app(cred)
-            self.db = firestore.client()
+            with profile_phase('credentials'):
+                cred = credentials.Certificate(credentials_path)
+            with profile_phase('initialize_app'):
+                if app_name is None:
+                    app = firebase_admin.initialize_app(cred)
+                else:
+                    app = firebase_admin.initialize_app(cred, name=app_name)
+            with profile_phase('channel'):
+                if database is None:
+                    self.db = firestore.client(app)
+                else:
+                    self.db = firestore.client(app, database_id=database)
+                if profiling_active():
+                    # The gRPC stub and channel are otherwise built lazily inside
+                    # the first RPC; build them here so they get their own phase.
+                    # The connection handshake itself still happens on first use.
+                    getattr(self.db, '_firestore_api', None)
             print("Successfully connected to Firebase!")
         except Exception as e:
             print(f"Error initializing Firebase: {e}")
             raise
     
-    def create_approval_request(self, title, description, requester_id, requester_email):
+    def close(self):
+        """
+        Drain the spool (best effort), stop background threads and close the trace.
+        """
+        if self.flusher is not None:
+            self.flusher.stop()
+            self.flusher = None
+        if self.spool is not None:
+            self.spool.close()
+            self.spool = None
+        if self.trace is not None:
+            self.trace.close()
+        if self.rest is not None:
+            self.rest.close()
+    
+    def _timeout(self, deadline):
+        # Time limit for one RPC: what is left of the deadline, capped by the
+        # client's default timeout
+        timeout = deadline.remaining() if deadline is not None else None
+        if self.timeout is not None:
+            timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+        return timeout
+    
+    def _rpc_options(self, deadline):
+        # Timeout and retry budget for one gRPC call
+        timeout = self._timeout(deadline)
+        if timeout is None:
+            return {}
+        return {'timeout': timeout, 'retry': Retry(deadline=timeout)}
+    
+    def _grpc(self, call):
+        # Run a gRPC call, reporting an expired deadline as DeadlineExceeded
+        try:
+            return call()
+        except google_exceptions.DeadlineExceeded as e:
+            raise DeadlineExceeded(str(e)) from e
+    
+    def _require_grpc(self, operation):
+        if self.db is None:
+            raise ValueError(f"{operation} needs the grpc transport")
+    
+    @_traced('create', lambda a, result: (
+        result, _payload_size(a['title'], a['description'], a['requester_id'], a['requester_email'])))
+    def create_approval_request(self, title, description, requester_id, requester_email,
+                                deadline=None):
         """
         Create a new approval request in Firestore.
         
@@ -40,10 +212,18 @@ class ApprovalClient:
             description: Detailed description of the request
             requester_id: ID or identifier of the requester
             requester_email: Email of the requester
+            deadline: Optional Deadline (or seconds) for the whole call
             
         Returns:
             ID of the created request
         """
+        if self.spool is not None:
+            request_id = self.spool.append(title, description, requester_id, requester_email)
+            if self.flusher is not None:
+                self.flusher.notify()
+            print(f"Spooled approval request with ID: {request_id}")
+            return request_id
+        
         try:
             # Create the request document
             request_data = {
@@ -51,49 +231,325 @@ class ApprovalClient:
                 'description': description,
                 'requesterId': requester_id,
                 'requesterEmail': requester_email,
-                'createdAt': firestore.SERVER_TIMESTAMP,
                 'status': 'pending'
             }
             
             # Add to Firestore
-            request_ref = self.db.collection('approvals').add(request_data)
-            request_id = request_ref[1].id
+            deadline = Deadline.coerce(deadline)
+            if self.rest is not None:
+                request_id = self.rest.create_document('approvals', request_data,
+                                                       server_timestamps=['createdAt'],
+                                                       timeout=self._timeout(deadline))
+            else:
+                request_data['createdAt'] = firestore.SERVER_TIMESTAMP
+                options = self._rpc_options(deadline)
+                request_ref = self._grpc(
+                    lambda: self.db.collection('approvals').add(request_data, **options))
+                request_id = request_ref[1].id
             print(f"Successfully created approval request with ID: {request_id}")
             return request_id
         
+        except DeadlineExceeded as e:
+            print(f"Timed out creating approval request: {e}")
+            raise
         except Exception as e:
             print(f"Error creating approval request: {e}")
             raise
     
-    def check_request_status(self, request_id):
+    @_traced('check', lambda a, result: (a['request_id'], 0))
+    def check_request_status(self, request_id, deadline=None):
         """
         Check the status of an approval request.
         
         Args:
             request_id: The ID of the request to check
+            deadline: Optional Deadline (or seconds) for the whole call
             
         Returns:
             Status of the request (pending, approved, rejected)
         """
         try:
-            request_doc = self.db.collection('approvals').document(request_id).get()
+            deadline = Deadline.coerce(deadline)
+            if self.rest is not None:
+                timeout = self._timeout(deadline)
+                fetch = lambda: self.rest.get_document('approvals', request_id, timeout=timeout)
+            else:
+                ref = self.db.collection('approvals').document(request_id)
+                options = self._rpc_options(deadline)
+                fetch = lambda: _snapshot_data(self._grpc(lambda: ref.get(**options)))
+            if self.hedger is not None:
+                request_data = self.hedger.call(fetch, deadline)
+            else:
+                request_data = fetch()
             
-            if request_doc.exists:
-                request_data = request_doc.to_dict()
+            if request_data is not None:
                 status = request_data.get('status', 'unknown')
                 print(f"Request {request_id} status: {status}")
                 return status
+            elif self.spool is not None and self.spool.contains(request_id):
+                print(f"Request {request_id} status: pending (spooled)")
+                return 'pending'
             else:
                 print(f"Request with ID {request_id} not found")
                 return None
         
+        except DeadlineExceeded as e:
+            print(f"Timed out checking request status: {e}")
+            raise
         except Exception as e:
             print(f"Error checking request status: {e}")
             raise
 
+    def get_requests(self, request_ids, deadline=None):
+        """
+        Read several approval requests in one round trip.
+        
+        Args:
+            request_ids: IDs of the requests to read
+            deadline: Optional Deadline (or seconds) for the whole call
+            
+        Returns:
+            Dict of request ID to request data (None if not found), in the order given
+        """
+        deadline = Deadline.coerce(deadline)
+        request_ids = list(request_ids)
+        with profile_phase('rpc'):
+            if self.rest is not None:
+                return self.rest.batch_get('approvals', request_ids, timeout=self._timeout(deadline))
+            collection = self.db.collection('approvals')
+            refs = [collection.document(request_id) for request_id in request_ids]
+            options = self._rpc_options(deadline)
+            snapshots = self._grpc(lambda: list(self.db.get_all(refs, **options)))
+        found = {snapshot.id: _snapshot_data(snapshot) for snapshot in snapshots}
+        return {request_id: found.get(request_id) for request_id in request_ids}
+
+    def list_requests(self, status=None, limit=50, deadline=None):
+        """
+        List approval requests, newest first.
+        
+        Args:
+            status: Only return requests with this status
+            limit: Maximum number of requests to return
+            deadline: Optional Deadline (or seconds) for the whole call
+            
+        Returns:
+            List of request dicts including the 'id'
+        """
+        deadline = Deadline.coerce(deadline)
+        with profile_phase('rpc'):
+            if self.rest is not None:
+                filters = [('status', '==', status)] if status else []
+                rows = self.rest.run_query('approvals', filters, order_by='createdAt',
+                                           direction='DESCENDING', limit=limit,
+                                           timeout=self._timeout(deadline))
+            else:
+                query = self.db.collection('approvals')
+                if status:
+                    query = query.where('status', '==', status)
+                query = query.order_by('createdAt', direction='DESCENDING').limit(limit)
+                options = self._rpc_options(deadline)
+                rows = self._grpc(lambda: [(snapshot.id, snapshot.to_dict())
+                                           for snapshot in query.stream(**options)])
+        return [dict(data, id=request_id) for request_id, data in rows]
+
+    def count_requests(self, status=None, deadline=None):
+        """
+        Count approval requests with an aggregation query.
+        
+        Args:
+            status: Only count requests with this status
+            deadline: Optional Deadline (or seconds) for the whole call
+            
+        Returns:
+            Number of matching requests
+        """
+        deadline = Deadline.coerce(deadline)
+        with profile_phase('rpc'):
+            if self.rest is not None:
+                filters = [('status', '==', status)] if status else []
+                return self.rest.count('approvals', filters, timeout=self._timeout(deadline))
+            query = self.db.collection('approvals')
+            if status:
+                query = query.where('status', '==', status)
+            options = self._rpc_options(deadline)
+            result = self._grpc(lambda: query.count().get(**options))
+            return int(result[0][0].value)
+
+    @_traced('lease', lambda a, result: (None, len(result or ())))
+    def lease_pending(self, n, lease_seconds=60, worker_id=None, window=4, deadline=None,
+                      requester_id=None):
+        """
+        Claim up to n of the oldest pending requests for one worker.
+        
+        Requests with an expired lease are claimable again, so work held by a
+        crashed worker is recovered automatically once its lease runs out.
+        
+        Args:
+            n: Maximum number of requests to claim
+            lease_seconds: How long the claim is valid without renewal
+            worker_id: Identifier of the claiming worker (random if None)
+            window: Candidates read per requested lease. Pending requests are read
+                    oldest first in pages of n * window, skipping ones leased by
+                    other workers, and a random subset of each page is claimed so
+                    that concurrent workers rarely contend for the same documents.
+                    Paging continues until n are claimed or no pending requests
+                    are left.
+            deadline: Optional Deadline (or seconds) for the whole call
+            requester_id: Only claim requests from this requester
+            
+        Returns:
+            List of Lease tuples, oldest request first
+        """
+        self._require_grpc('Leasing')
+        worker_id = worker_id or uuid.uuid4().hex
+        deadline = Deadline.coerce(deadline)
+        collection = self.db.collection('approvals')
+        
+        @firestore.transactional
+        def claim(transaction, refs, wanted):
+            now = datetime.datetime.now(datetime.timezone.utc)
+            expires_at = now + datetime.timedelta(seconds=lease_seconds)
+            leases = []
+            # All reads must complete before the first write in a transaction
+            snapshots = list(self.db.get_all(refs, transaction=transaction,
+                                             **self._rpc_options(deadline)))
+            for snapshot in snapshots:
+                data = snapshot.to_dict() if snapshot.exists else None
+                if len(leases) >= wanted or not data:
+                    continue
+                if data.get('status') != 'pending' or lease_active(data, now):
+                    continue
+                token = uuid.uuid4().hex
+                transaction.update(snapshot.reference, {
+                    'leaseOwner': worker_id,
+                    'leaseToken': token,
+                    'leaseExpiresAt': expires_at,
+                })
+                leases.append(Lease(snapshot.id, token, worker_id, expires_at, data))
+            return leases
+        
+        query = collection.where('status', '==', 'pending')
+        if requester_id is not None:
+            query = query.where('requesterId', '==', requester_id)
+        query = query.order_by('createdAt')
+        page_size = n * window
+        leases = []
+        cursor = None
+        try:
+            while len(leases) < n and not (deadline is not None and deadline.expired()):
+                page_query = query.limit(page_size)
+                if cursor is not None:
+                    page_query = page_query.start_after(cursor)
+                page = list(page_query.stream(**self._rpc_options(deadline)))
+                if not page:
+                    break
+                cursor = page[-1]
+                now = datetime.datetime.now(datetime.timezone.utc)
+                refs = [snapshot.reference for snapshot in page
+                        if not lease_active(snapshot.to_dict(), now)]
+                if refs:
+                    wanted = n - len(leases)
+                    refs = random.sample(refs, min(len(refs), wanted * 2))
+                    leases.extend(claim(self.db.transaction(), refs, wanted))
+                if len(page) < page_size:
+                    break
+        except Exception as e:
+            print(f"Error leasing pending requests: {e}")
+            raise
+        now = datetime.datetime.now(datetime.timezone.utc)
+        leases.sort(key=lambda lease: lease.data.get('createdAt') or now)
+        return leases
+    
+    def _update_leased(self, lease, updates, deadline=None):
+        # Apply updates only while the caller still holds the lease
+        self._require_grpc('Leasing')
+        ref = self.db.collection('approvals').document(lease.request_id)
+        deadline = Deadline.coerce(deadline)
+        
+        @firestore.transactional
+        def apply(transaction):
+            snapshot = ref.get(transaction=transaction, **self._rpc_options(deadline))
+            data = snapshot.to_dict() if snapshot.exists else {}
+            now = datetime.datetime.now(datetime.timezone.utc)
+            if data.get('leaseToken') != lease.token or not lease_active(data, now):
+                raise LeaseLostError(f"Lease on request {lease.request_id} is no longer held")
+            if data.get('status') != 'pending':
+                # Decided elsewhere (e.g. in the app) while the lease was held
+                raise LeaseLostError(f"Request {lease.request_id} was already "
+                                     f"{data.get('status')}")
+            transaction.update(ref, updates)
+        
+        apply(self.db.transaction())
+    
+    @_traced('renew', lambda a, result: (a['lease'].request_id, 0))
+    def renew_lease(self, lease, lease_seconds=60, deadline=None):
+        """
+        Extend a lease held by this worker.
+        
+        Args:
+            lease: The Lease to renew
+            lease_seconds: New lease duration from now
+            deadline: Optional Deadline (or seconds) for the whole call
+            
+        Returns:
+            The renewed Lease
+        """
+        expires_at = (datetime.datetime.now(datetime.timezone.utc)
+                      + datetime.timedelta(seconds=lease_seconds))
+        self._update_leased(lease, {'leaseExpiresAt': expires_at}, deadline)
+        return lease._replace(expires_at=expires_at)
+    
+    @_traced('release', lambda a, result: (a['lease'].request_id, 0))
+    def release_lease(self, lease, deadline=None):
+        """
+        Give a leased request back to the queue without deciding it.
+        """
+        self._require_grpc('Leasing')
+        self._update_leased(lease, _clear_lease(), deadline)
+    
+    @_traced('complete', lambda a, result: (a['lease'].request_id, 0))
+    def complete_lease(self, lease, status, deadline=None):
+        """
+        Record a decision for a leased request and drop the lease.
+        
+        Args:
+            lease: The Lease held on the request
+            status: Decision to record ('approved' or 'rejected')
+            deadline: Optional Deadline (or seconds) for the whole call
+        """
+        if status not in ('approved', 'rejected'):
+            raise ValueError(f"Invalid decision status: {status}")
+        self._require_grpc('Leasing')
+        updates = _clear_lease()
+        updates['status'] = status
+        self._update_leased(lease, updates, deadline)
+
+def _snapshot_data(snapshot):
+    return snapshot.to_dict() if snapshot.exists else None
+
+def lease_active(data, now):
+    """
+    Whether a request's data shows a lease that has not expired at `now`.
+    """
+    expires_at = data.get('leaseExpiresAt')
+    return expires_at is not None and expires_at > now
+
+def _clear_lease():
+    return {
+        'leaseOwner': firestore.DELETE_FIELD,
+        'leaseToken': firestore.DELETE_FIELD,
+        'leaseExpiresAt': firestore.DELETE_FIELD,
+    }
+
 def main():
     parser = argparse.ArgumentParser(description='Firebase Approval Request Client')
     parser.add_argument('--credentials', help='Path to Firebase credentials JSON file')
+    parser.add_argument('--trace', help='Record an operation trace to this file')
+    parser.add_argument('--timeout', type=float, help='Time limit in seconds for each operation')
+    parser.add_argument('--spool', help='Write-behind spool file; create returns once the request is spooled')
+    parser.add_argument('--transport', choices=TRANSPORTS, default='grpc',
+                        help='Talk to Firestore over gRPC or the faster-starting REST API')
+    add_profile_arguments(parser)
     
     subparsers = parser.add_subparsers(dest='command', help='Command to run')
     
@@ -108,10 +564,19 @@ def main():
     check_parser = subparsers.add_parser('check', help='Check the status of an approval request')
     check_parser.add_argument('--request-id', required=True, help='ID of the request to check')
     
+    # List requests command
+    list_parser = subparsers.add_parser('list', help='List the newest approval requests')
+    list_parser.add_argument('--status', choices=['pending', 'approved', 'rejected'],
+                             help='Only list requests with this status')
+    list_parser.add_argument('--limit', type=int, default=20, help='Maximum number of requests')
+    
     args = parser.parse_args()
+    start_profiling(args)
     
     try:
-        client = ApprovalClient(args.credentials)
+        client = ApprovalClient(args.credentials, trace_path=args.trace, timeout=args.timeout,
+                                spool_path=args.spool, spool_flush=False,
+                                transport=args.transport)
         
         if args.command == 'create':
             client.create_approval_request(
@@ -122,6 +587,10 @@ def main():
             )
         elif args.command == 'check':
             client.check_request_status(args.request_id)
+        elif args.command == 'list':
+            for request in client.list_requests(status=args.status, limit=args.limit):
+                print(f"{request['id']}  {request.get('status', 'unknown'):<8}  "
+                      f"{request.get('createdAt')}  {request.get('title')}")
         else:
             parser.print_help()
     
@@ -0,0 +1,415 @@
+import datetime
+import json
+import os
+import queue
+import socket
+import sys
+import threading
+import time
+import urllib.request
+
+STOP = object()
+
+
+def _isoformat(value):
+    return value.isoformat() if isinstance(value, datetime.datetime) else value
+
+
+def make_event(event_type, request_id, data):
+    """
+    Build a change event. The ID is deterministic, so sinks can drop duplicates
+    delivered after a crash.
+    """
+    data = data or {}
+    return {
+        'id': f"{request_id}:{event_type}",
+        'type': event_type,
+        'requestId': request_id,
+        'status': data.get('status'),
+        'title': data.get('title'),
+        'requesterId': data.get('requesterId'),
+        'requesterEmail': data.get('requesterEmail'),
+        'createdAt': _isoformat(data.get('createdAt')),
+        'emittedAt': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+    }
+
+
+class StdoutSink:
+    """Write events to stdout as JSON Lines."""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def send(self, events):
+        self.stream.write(''.join(json.dumps(event) + '\n' for event in events))
+        self.stream.flush()
+
+    def close(self):
+        pass
+
+
+class WebhookSink:
+    """POST batches of events as a JSON array to an HTTP endpoint."""
+
+    def __init__(self, url, timeout=10):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, events):
+        body = json.dumps(events).encode('utf-8')
+        request = urllib.request.Request(self.url, data=body, method='POST',
+                                         headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+    def close(self):
+        pass
+
+
+class UnixSocketSink:
+    """Stream events as JSON Lines to a Unix domain socket, reconnecting as needed."""
+
+    def __init__(self, path):
+        self.path = path
+        self._socket = None
+
+    def send(self, events):
+        payload = ''.join(json.dumps(event) + '\n' for event in events).encode('utf-8')
+        if self._socket is None:
+            self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._socket.connect(self.path)
+        try:
+            self._socket.sendall(payload)
+        except OSError:
+            self.close()
+            raise
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+
+def parse_sink(spec):
+    """
+    Create a sink from a command-line spec: "stdout", "webhook=URL" or "unix=PATH".
+    """
+    kind, _, target = spec.partition('=')
+    if kind == 'stdout':
+        return StdoutSink()
+    if kind == 'webhook' and target:
+        return WebhookSink(target)
+    if kind == 'unix' and target:
+        return UnixSocketSink(target)
+    raise ValueError(f"Unknown sink {spec}; use stdout, webhook=URL or unix=PATH")
+
+
+class SinkRunner:
+    def __init__(self, sink, on_ack, buffer_size=10000, batch_size=500, linger=0.05,
+                 max_backoff=30):
+        """
+        Deliver events to one sink from a bounded buffer, in batches, with retries.
+
+        When the buffer is full, publishing blocks, which pushes back on the
+        feed instead of dropping events or growing memory without bound.
+
+        Args:
+            sink: Object with send(events) and close()
+            on_ack: Called with (runner, sequence) once a sequence is delivered
+            buffer_size: Maximum events waiting for this sink
+            batch_size: Maximum events per send()
+            linger: Seconds to wait for a batch to fill up
+            max_backoff: Upper bound on the retry delay in seconds
+        """
+        self.sink = sink
+        self.on_ack = on_ack
+        self.batch_size = batch_size
+        self.linger = linger
+        self.max_backoff = max_backoff
+        self.delivered = 0
+        self._queue = queue.Queue(maxsize=buffer_size)
+        self._thread = threading.Thread(target=self._run, name=f"sink-{type(sink).__name__}",
+                                        daemon=True)
+        self._thread.start()
+
+    def publish(self, sequence, events):
+        for event in events:
+            self._queue.put((sequence, event))
+        # A marker so the sequence is acknowledged even if it had no events
+        self._queue.put((sequence, None))
+
+    def _send_with_retry(self, events):
+        failures = 0
+        while True:
+            try:
+                self.sink.send(events)
+                self.delivered += len(events)
+                return
+            except Exception as e:
+                failures += 1
+                delay = min(self.max_backoff, 0.1 * 2 ** failures)
+                print(f"Error sending to {type(self.sink).__name__} "
+                      f"(retrying in {delay:.1f}s): {e}", file=sys.stderr)
+                time.sleep(delay)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is STOP:
+                return
+            batch, acked = [], None
+            linger_until = time.monotonic() + self.linger
+            while True:
+                sequence, event = item
+                if event is None:
+                    acked = sequence
+                else:
+                    batch.append(event)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, linger_until - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is STOP:
+                    self._queue.put(STOP)
+                    break
+            if batch:
+                self._send_with_retry(batch)
+            if acked is not None:
+                self.on_ack(self, acked)
+
+    def close(self):
+        self._queue.put(STOP)
+        self._thread.join()
+        self.sink.close()
+
+
+class FeedCheckpoint:
+    def __init__(self, path, save_interval=1.0):
+        """
+        Position of a ChangeFeed: the newest createdAt emitted and the IDs of the
+        requests known to be pending, persisted as JSON.
+
+        The live position moves as snapshots arrive. Each published batch takes
+        only the changes since the previous one, and they are folded into the
+        acknowledged position once every sink has delivered the batch. The
+        file is rewritten at most every save_interval seconds. A crash can
+        therefore replay up to that much of the feed, which at-least-once
+        delivery allows.
+
+        Args:
+            path: JSON file to persist the position in, or None
+            save_interval: Minimum seconds between writes of the file
+        """
+        self.path = path
+        self.save_interval = save_interval
+        self.created_at = None
+        self.pending = set()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            if state.get('createdAt'):
+                self.created_at = datetime.datetime.fromisoformat(state['createdAt'])
+            self.pending = set(state.get('pending', []))
+        self._acked_created_at = self.created_at
+        self._acked_pending = set(self.pending)
+        self._changes = {}
+        self._dirty = False
+        self._saved_at = 0.0
+
+    @property
+    def exists(self):
+        return self.created_at is not None or bool(self.pending)
+
+    def add(self, request_id):
+        self.pending.add(request_id)
+        self._changes[request_id] = True
+
+    def discard(self, request_id):
+        self.pending.discard(request_id)
+        self._changes[request_id] = False
+
+    def take_changes(self):
+        """
+        Return (created_at, {request ID: still pending}) for everything changed
+        since the previous call.
+        """
+        changes, self._changes = self._changes, {}
+        return self.created_at, changes
+
+    def acknowledge(self, created_at, changes):
+        """
+        Fold changes from take_changes() into the position that gets saved.
+        """
+        if created_at is not None:
+            self._acked_created_at = created_at
+        for request_id, pending in changes.items():
+            if pending:
+                self._acked_pending.add(request_id)
+            else:
+                self._acked_pending.discard(request_id)
+        self._dirty = True
+
+    def save(self, force=False):
+        if not self.path or not self._dirty:
+            return
+        if not force and time.monotonic() - self._saved_at < self.save_interval:
+            return
+        state = {
+            'createdAt': _isoformat(self._acked_created_at),
+            'pending': sorted(self._acked_pending),
+        }
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(temp_path, self.path)
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+
+class ChangeFeed:
+    def __init__(self, client, sinks, checkpoint_path=None, include_existing=False,
+                 buffer_size=10000, batch_size=500, linger=0.05, checkpoint_interval=1.0):
+        """
+        Collection-wide feed of 'added' and 'decided' events for approval requests.
+
+        A single listener on pending requests drives the feed: a request joining
+        the pending set is 'added', and one leaving it is read once and reported
+        as 'decided' (or 'deleted'). The feed position advances once every sink
+        has delivered a batch and is saved at most every checkpoint_interval
+        seconds, and on stop(). On restart, requests decided while the
+        feed was down are found by comparing the checkpointed pending set with
+        the current one, and requests created and decided while down by a query
+        on createdAt. Delivery is at-least-once with deterministic event IDs.
+
+        Args:
+            client: The ApprovalClient instance
+            sinks: Sink objects to deliver events to
+            checkpoint_path: File to persist the feed position in
+            include_existing: Without a checkpoint, also emit 'added' for requests
+                              that are already pending when the feed starts
+            buffer_size: Maximum events buffered per sink
+            batch_size: Maximum events per sink delivery
+            linger: Seconds a sink waits for more events before delivering a batch
+            checkpoint_interval: Minimum seconds between checkpoint writes
+        """
+        self.client = client
+        self.collection = client.db.collection('approvals')
+        self.checkpoint = FeedCheckpoint(checkpoint_path, save_interval=checkpoint_interval)
+        self._lock = threading.Lock()
+        self._sequence = 0
+        self._states = {}
+        self._acked = {}
+        self.runners = [SinkRunner(sink, self._on_ack, buffer_size=buffer_size,
+                                   batch_size=batch_size, linger=linger) for sink in sinks]
+        self._watch = None
+        self._first_snapshot = True
+        self.include_existing = include_existing
+        self.emitted = 0
+
+    def _on_ack(self, runner, sequence):
+        with self._lock:
+            self._acked[runner] = sequence
+            if len(self._acked) < len(self.runners):
+                return
+            safe = min(self._acked.values())
+            for done in sorted(s for s in self._states if s <= safe):
+                self.checkpoint.acknowledge(*self._states.pop(done))
+            # Saved under the lock so an older state never overwrites a newer one
+            self.checkpoint.save()
+
+    def _publish(self, events):
+        with self._lock:
+            self._sequence += 1
+            sequence = self._sequence
+            self._states[sequence] = self.checkpoint.take_changes()
+            self.emitted += len(events)
+        for runner in self.runners:
+            runner.publish(sequence, events)
+
+    def _note_created(self, data):
+        created_at = data.get('createdAt')
+        if isinstance(created_at, datetime.datetime):
+            if self.checkpoint.created_at is None or created_at > self.checkpoint.created_at:
+                self.checkpoint.created_at = created_at
+
+    def _decided_events(self, request_ids):
+        events = []
+        refs = [self.collection.document(request_id) for request_id in request_ids]
+        for snapshot in self.client.db.get_all(refs):
+            if snapshot.exists:
+                data = snapshot.to_dict()
+                if data.get('status') == 'pending':
+                    continue  # Still pending; the listener will report it again
+                events.append(make_event('decided', snapshot.id, data))
+            else:
+                events.append(make_event('deleted', snapshot.id, None))
+            self.checkpoint.discard(snapshot.id)
+        return events
+
+    def _catch_up(self):
+        # Requests created and decided while the feed was down never show up
+        # in the pending listener
+        events = []
+        if self.checkpoint.created_at is None:
+            return events
+        query = self.collection.where('createdAt', '>', self.checkpoint.created_at)
+        for snapshot in query.stream():
+            data = snapshot.to_dict()
+            self._note_created(data)
+            if data.get('status') != 'pending':
+                events.append(make_event('added', snapshot.id, data))
+                events.append(make_event('decided', snapshot.id, data))
+        return events
+
+    def _on_snapshot(self, docs, changes, read_time):
+        try:
+            events = []
+            if self._first_snapshot:
+                self._first_snapshot = False
+                resumed = self.checkpoint.exists
+                current = {doc.id for doc in docs}
+                if resumed:
+                    events.extend(self._catch_up())
+                    gone = self.checkpoint.pending - current
+                    if gone:
+                        events.extend(self._decided_events(gone))
+                elif not self.include_existing:
+                    # Start from now: remember what is pending without emitting it
+                    for doc in docs:
+                        self.checkpoint.add(doc.id)
+                        self._note_created(doc.to_dict())
+            removed = []
+            for change in changes:
+                request_id = change.document.id
+                if change.type.name == 'ADDED' and request_id not in self.checkpoint.pending:
+                    data = change.document.to_dict()
+                    self.checkpoint.add(request_id)
+                    self._note_created(data)
+                    events.append(make_event('added', request_id, data))
+                elif change.type.name == 'REMOVED':
+                    removed.append(request_id)
+            if removed:
+                # One batched read for every request that left the pending set
+                events.extend(self._decided_events(removed))
+            self._publish(events)
+        except Exception as e:
+            print(f"Error processing change feed snapshot: {e}", file=sys.stderr)
+
+    def start(self):
+        self._watch = self.collection.where('status', '==', 'pending').on_snapshot(
+            self._on_snapshot
+        )
+
+    def stop(self):
+        """
+        Stop listening and deliver everything already buffered.
+        """
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+        for runner in self.runners:
+            runner.close()
+        with self._lock:
+            self.checkpoint.save(force=True)
@@ -2,7 +2,9 @@
 import argparse
 import time
 import sys
+from profiling import add_profile_arguments, start_profiling
 from approval_client import ApprovalClient
+from deadlines import Deadline, DeadlineExceeded
 import random
 
 # Sample data for generating requests
@@ -31,7 +33,8 @@ DESCRIPTIONS = [
 def create_and_watch_request(client, title=None, description=None, requester_id="test_user", 
                             requester_email="test@example.com", interval=5, timeout=600):
     """
-    Create a request and watch it until status changes
+    Create a request and watch it until status changes. The timeout covers
+    the create as well as the watch.
     
     Args:
         client: The ApprovalClient instance
@@ -51,6 +54,8 @@ def create_and_watch_request(client, title=None, description=None, requester_id=
     if description is None:
         description = random.choice(DESCRIPTIONS)
     
+    request_id = None
+    deadline = Deadline(timeout)
     try:
         # Create the request
         print(f"Creating approval request: '{title}'")
@@ -61,7 +66,8 @@ def create_and_watch_request(client, title=None, description=None, requester_id=
             title=title,
             description=description,
             requester_id=requester_id,
-            requester_email=requester_email
+            requester_email=requester_email,
+            deadline=deadline
         )
         
         if not request_id:
@@ -77,7 +83,7 @@ def create_and_watch_request(client, title=None, description=None, requester_id=
         print(f"Will check every {interval} seconds (timeout after {timeout} seconds)")
         
         # Get initial status
-        initial_status = client.check_request_status(request_id)
+        initial_status = client.check_request_status(request_id, deadline=deadline)
         if initial_status is None:
             print("Request not found. Exiting.")
             return request_id, None
@@ -89,7 +95,7 @@ def create_and_watch_request(client, title=None, description=None, requester_id=
         elapsed = 0
         
         while elapsed < timeout:
-            status = client.check_request_status(request_id)
+            status = client.check_request_status(request_id, deadline=deadline)
             
             if status is None:
                 print("Request not found. Exiting.")
@@ -109,12 +115,19 @@ def create_and_watch_request(client, title=None, description=None, requester_id=
             sys.stdout.write(f"\rWaiting for approval [{bar}] {progress:.1f}% ({elapsed:.0f}s)")
             sys.stdout.flush()
             
-            time.sleep(interval)
+            deadline.wait(interval)
+            deadline.remaining()  # Raises once the deadline passes
             elapsed = time.time() - start_time
         
         print("\n⏰ Timeout reached. Request is still pending.")
         return request_id, 'timeout'
         
+    except DeadlineExceeded:
+        if request_id is None:
+            print("\n⏰ Timeout reached before the request was created.")
+        else:
+            print("\n⏰ Timeout reached. Request is still pending.")
+        return request_id, 'timeout'
     except Exception as e:
         print(f"Error creating or watching request: {e}")
         return None, None
@@ -136,7 +149,9 @@ def main():
     parser.add_argument('--timeout', type=int, default=600,
                         help='Maximum time to wait in seconds (default: 10 minutes)')
     
+    add_profile_arguments(parser)
     args = parser.parse_args()
+    start_profiling(args)
     
     try:
         print(f"Initializing client with credentials from: {args.credentials}")
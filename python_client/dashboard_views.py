@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+import argparse
+import datetime
+import os
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import quote
+from profiling import add_profile_arguments, start_profiling
+from firebase_admin import firestore
+from approval_client import ApprovalClient
+from change_feed import ChangeFeed
+
+STATUSES = ('pending', 'approved', 'rejected')
+
+# Fields kept for each item in the latest-pending list (what the list view shows)
+LIST_FIELDS = ['title', 'requesterEmail', 'createdAt', 'status']
+
+# How long after a recount events are still checked against what its scan saw,
+# to cover events that were already on their way when the scan ended
+SCAN_GRACE = 60
+
+# Writes per batched write (Firestore allows 500)
+BATCH_WRITES = 400
+
+
+def _parse_time(value):
+    if isinstance(value, str):
+        return datetime.datetime.fromisoformat(value)
+    return value
+
+
+def _requester_doc_id(requester_id):
+    # Document IDs cannot contain '/', be empty, be '.' or '..', or match __.*__.
+    # quote() escapes '%', so a leading bare '%' cannot clash with a real ID.
+    doc_id = quote(requester_id, safe='')
+    if doc_id in ('', '.', '..') or (doc_id.startswith('__') and doc_id.endswith('__')):
+        doc_id = '%' + doc_id
+    return doc_id
+
+
+class DashboardViews:
+    def __init__(self, client, latest_count=20, collection='dashboard'):
+        """
+        Summary documents for the dashboard, maintained incrementally from change events.
+
+        Kept in the `dashboard` collection:
+          - summary: counts per status and the latest pending requests with just
+            the list-view fields
+          - summary/requesters/{requester}: counts per status for one requester
+
+        This object is a ChangeFeed sink. The feed batches events, so each
+        send() applies a whole burst of changes and writes the summary and the
+        requester documents that changed in one batched write.
+
+        Args:
+            client: The ApprovalClient instance
+            latest_count: Number of pending requests kept in the summary
+            collection: Collection holding the summary documents
+        """
+        self.client = client
+        self.latest_count = latest_count
+        self.approvals = client.db.collection('approvals')
+        self.summary_ref = client.db.collection(collection).document('summary')
+        self.requesters = self.summary_ref.collection('requesters')
+        self.counts = {status: 0 for status in STATUSES}
+        self.requester_counts = defaultdict(lambda: {status: 0 for status in STATUSES})
+        self.latest = []
+        self.writes = 0
+        self._dirty = set()
+        # Events delivered before load() or rebuild() completed, or while a
+        # recount scans; None when events are applied as they arrive
+        self._held = []
+        self.ready = False
+        # Request ID -> status as seen by the last recount, until _seen_until
+        self._seen = None
+        self._seen_until = 0.0
+        self._lock = threading.Lock()
+
+    def load(self):
+        """
+        Load the counts from the existing summary documents.
+
+        Returns:
+            False if there are no complete summary documents yet
+        """
+        summary = self.summary_ref.get()
+        if not summary.exists:
+            return False
+        data = summary.to_dict()
+        if data.get('rebuilding'):
+            return False
+        self.counts.update(data.get('counts', {}))
+        self.counts.pop('total', None)
+        for snapshot in self.requesters.stream():
+            requester = snapshot.to_dict()
+            self.requester_counts[requester.get('requesterId', '')].update(requester.get('counts', {}))
+        self.refresh_latest()
+        with self._lock:
+            held, self._held = self._held, None
+            self.ready = True
+            if held:
+                self._send(held)
+        return True
+
+    def mark_rebuilding(self):
+        """
+        Flag the summary as incomplete until the first rebuild has written it,
+        so that load() after a crash mid-rebuild rebuilds again.
+        """
+        self.summary_ref.set({'rebuilding': True}, merge=True)
+
+    def rebuild(self):
+        """
+        Recompute every count with one projection scan of the approvals
+        collection and rewrite the summaries.
+
+        The feed may keep delivering meanwhile. Events that arrive during the
+        scan are held and applied afterwards, and for SCAN_GRACE seconds each
+        event is checked against the status the scan saw for its request, so a
+        change the scan already counted is not counted again.
+        """
+        with self._lock:
+            if self._held is None:
+                self._held = []
+        try:
+            counts = {status: 0 for status in STATUSES}
+            requester_counts = defaultdict(lambda: {status: 0 for status in STATUSES})
+            seen = {}
+            for snapshot in self.approvals.select(['requesterId', 'status']).stream():
+                data = snapshot.to_dict()
+                status = data.get('status', 'pending')
+                if status in STATUSES:
+                    counts[status] += 1
+                    requester_counts[data.get('requesterId') or ''][status] += 1
+                seen[snapshot.id] = status
+        except Exception:
+            if self.ready:
+                with self._lock:
+                    held, self._held = self._held, None
+                    self._send(held)
+            raise
+
+        with self._lock:
+            held, self._held = self._held, None
+            # Rewrite every requester, including ones that no longer have requests
+            self._dirty.update(self.requester_counts)
+            self._dirty.update(requester_counts)
+            self.counts = counts
+            self.requester_counts = requester_counts
+            self.ready = True
+            self._seen = seen
+            self._seen_until = time.monotonic() + SCAN_GRACE
+            for event in held:
+                self._apply(event)
+            self.refresh_latest()
+            self.write()
+
+    def reconcile(self):
+        """
+        Recount statuses and per-requester counts, correcting any drift in the
+        incrementally maintained counts.
+
+        Events held during the scan are acknowledged to the feed before they
+        are written, so the summary is flagged as rebuilding until the recount
+        has written it: after a crash mid-scan, load() then rebuilds instead of
+        resuming past those events.
+        """
+        self.mark_rebuilding()
+        self.rebuild()
+
+    def refresh_latest(self):
+        query = (self.approvals
+                 .where('status', '==', 'pending')
+                 .order_by('createdAt', direction='DESCENDING')
+                 .limit(self.latest_count)
+                 .select(LIST_FIELDS))
+        self.latest = []
+        for snapshot in query.stream():
+            item = {'id': snapshot.id}
+            item.update(snapshot.to_dict())
+            self.latest.append(item)
+
+    def _counted_by_scan(self, event):
+        # True if the last recount's scan already reflects this event. Tracks
+        # each request's status from what the scan saw through later events.
+        if self._seen is None:
+            return False
+        if time.monotonic() > self._seen_until:
+            self._seen = None
+            return False
+        request_id = event['requestId']
+        if event['type'] == 'added':
+            if request_id in self._seen:
+                return True
+            self._seen[request_id] = 'pending'
+            return False
+        if self._seen.get(request_id) != 'pending':
+            return True
+        if event['type'] == 'decided':
+            self._seen[request_id] = event.get('status')
+        else:
+            del self._seen[request_id]
+        return False
+
+    def _apply(self, event):
+        # Returns True if the latest-pending list must be re-read
+        if self._counted_by_scan(event):
+            return False
+        requester_id = event.get('requesterId') or ''
+        requester = self.requester_counts[requester_id]
+        self._dirty.add(requester_id)
+        if event['type'] == 'added':
+            self.counts['pending'] += 1
+            requester['pending'] += 1
+            created_at = _parse_time(event.get('createdAt'))
+            if created_at is None:
+                return False
+            oldest = self.latest[-1]['createdAt'] if self.latest else None
+            if len(self.latest) < self.latest_count or oldest is None or created_at > oldest:
+                self.latest.append({
+                    'id': event['requestId'],
+                    'title': event.get('title'),
+                    'requesterEmail': event.get('requesterEmail'),
+                    'createdAt': created_at,
+                    'status': 'pending',
+                })
+                self.latest.sort(key=lambda item: item['createdAt'], reverse=True)
+                del self.latest[self.latest_count:]
+            return False
+        # 'decided' or 'deleted': the request left the pending set
+        self.counts['pending'] = max(0, self.counts['pending'] - 1)
+        requester['pending'] = max(0, requester['pending'] - 1)
+        if event['type'] == 'decided' and event.get('status') in STATUSES:
+            self.counts[event['status']] += 1
+            requester[event['status']] += 1
+        return any(item['id'] == event['requestId'] for item in self.latest)
+
+    def _send(self, events):
+        refill = False
+        for event in events:
+            refill = self._apply(event) or refill
+        if refill:
+            self.refresh_latest()
+        self.write()
+
+    def send(self, events):
+        with self._lock:
+            if self._held is not None:
+                # Counts not loaded yet, or a recount is scanning
+                self._held.extend(events)
+                return
+            self._send(events)
+
+    def write(self):
+        """
+        Write the summary and the requester documents changed since the last
+        write, in as few batched writes as possible.
+        """
+        counts = dict(self.counts, total=sum(self.counts.values()))
+        batch = self.client.db.batch()
+        batch.set(self.summary_ref, {
+            'counts': counts,
+            'latestPending': self.latest,
+            'updatedAt': firestore.SERVER_TIMESTAMP,
+        })
+        batched = 1
+        for requester_id in sorted(self._dirty):
+            if batched >= BATCH_WRITES:
+                batch.commit()
+                batch = self.client.db.batch()
+                batched = 0
+            ref = self.requesters.document(_requester_doc_id(requester_id))
+            requester = self.requester_counts.get(requester_id)
+            if requester is None or not any(requester.values()):
+                self.requester_counts.pop(requester_id, None)
+                batch.delete(ref)
+            else:
+                batch.set(ref, {
+                    'requesterId': requester_id,
+                    'counts': dict(requester),
+                    'updatedAt': firestore.SERVER_TIMESTAMP,
+                })
+            batched += 1
+        batch.commit()
+        self._dirty.clear()
+        self.writes += 1
+
+    def close(self):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain dashboard summary documents')
+    parser.add_argument('--credentials', default='./service-account-key.json',
+                        help='Path to Firebase credentials JSON file')
+    parser.add_argument('--checkpoint', default='dashboard-views.json',
+                        help='Change feed checkpoint file, so restarts resume')
+    parser.add_argument('--latest', type=int, default=20,
+                        help='Number of pending requests kept in the summary')
+    parser.add_argument('--debounce', type=float, default=1.0,
+                        help='Seconds to coalesce changes before writing the summaries')
+    parser.add_argument('--reconcile-interval', type=float, default=3600,
+                        help='Seconds between full recounts of the summaries')
+
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    start_profiling(args)
+
+    try:
+        print(f"Initializing client with credentials from: {args.credentials}")
+        client = ApprovalClient(args.credentials)
+        views = DashboardViews(client, latest_count=args.latest)
+
+        rebuild = not (os.path.exists(args.checkpoint) and views.load())
+        if rebuild:
+            if os.path.exists(args.checkpoint):
+                os.remove(args.checkpoint)
+            views.mark_rebuilding()
+        else:
+            print("Loaded existing summaries; resuming from checkpoint")
+
+        # Start the feed first, so nothing that changes during the build is missed
+        feed = ChangeFeed(client, [views], checkpoint_path=args.checkpoint,
+                          batch_size=100000, linger=args.debounce)
+        feed.start()
+        if rebuild:
+            print("Building summaries from the approvals collection...")
+            views.rebuild()
+        print(f"Maintaining dashboard summaries: {views.counts}. Press Ctrl+C to stop.")
+        try:
+            last_reconcile = time.monotonic()
+            while True:
+                time.sleep(1)
+                if time.monotonic() - last_reconcile >= args.reconcile_interval:
+                    last_reconcile = time.monotonic()
+                    views.reconcile()
+        except KeyboardInterrupt:
+            feed.stop()
+            print(f"\nStopped after {views.writes} summary writes")
+
+    except Exception as e:
+        print(f"Error: {e}")
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,173 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when an operation's deadline passes before it completes."""
+
+
+class Cancelled(Exception):
+    """Raised when an operation is cancelled through its Deadline."""
+
+
+class Deadline:
+    def __init__(self, seconds=None):
+        """
+        A point in time by which an operation, and everything it calls, must finish.
+
+        Pass the same Deadline down through nested calls so each RPC only gets
+        the time that is left. It also carries a cancellation flag: waits made
+        through wait() return as soon as cancel() is called from another thread.
+
+        Args:
+            seconds: Time budget from now, or None for no limit
+        """
+        self.expires_at = None if seconds is None else time.monotonic() + seconds
+        self._cancelled = threading.Event()
+
+    @classmethod
+    def coerce(cls, value):
+        """
+        Accept a Deadline, a number of seconds or None.
+        """
+        if value is None or isinstance(value, Deadline):
+            return value
+        return cls(value)
+
+    def cancel(self):
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def remaining(self):
+        """
+        Seconds left (None if unlimited).
+
+        Raises:
+            Cancelled: If the deadline was cancelled
+            DeadlineExceeded: If no time is left
+        """
+        if self._cancelled.is_set():
+            raise Cancelled("Operation was cancelled")
+        if self.expires_at is None:
+            return None
+        left = self.expires_at - time.monotonic()
+        if left <= 0:
+            raise DeadlineExceeded("Deadline exceeded")
+        return left
+
+    def expired(self):
+        return self.expires_at is not None and time.monotonic() >= self.expires_at
+
+    def wait(self, seconds):
+        """
+        Sleep for up to `seconds`, cut short by the deadline or cancellation.
+
+        Returns:
+            False if the wait ended early because of cancellation or expiry
+        """
+        if self.expires_at is not None:
+            seconds = min(seconds, max(0.0, self.expires_at - time.monotonic()))
+        if self._cancelled.wait(seconds):
+            return False
+        return not self.expired()
+
+
+class LatencyTracker:
+    def __init__(self, window=200):
+        """
+        Rolling window of recent latencies used to decide when to hedge.
+
+        Args:
+            window: Number of recent samples kept
+        """
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, point, default=None):
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < 20:
+            return default
+        return samples[min(len(samples) - 1, int(point / 100 * len(samples)))]
+
+
+class HedgedCaller:
+    def __init__(self, percentile=95, minimum_delay=0.02, initial_delay=0.25, max_workers=8):
+        """
+        Issue a second copy of a slow idempotent read and take whichever answers first.
+
+        The backup is only sent once the first attempt has taken longer than the
+        observed p95 latency, so roughly 5% of reads are duplicated.
+
+        Args:
+            percentile: Latency percentile after which a backup request is sent
+            minimum_delay: Lower bound on the hedge delay in seconds
+            initial_delay: Hedge delay used until enough samples are collected
+            max_workers: Threads available for in-flight attempts
+        """
+        self.percentile = percentile
+        self.minimum_delay = minimum_delay
+        self.initial_delay = initial_delay
+        self.tracker = LatencyTracker()
+        self.hedged = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='hedged-read')
+
+    def _timed(self, fn):
+        started = time.monotonic()
+        result = fn()
+        self.tracker.add(time.monotonic() - started)
+        return result
+
+    def call(self, fn, deadline=None):
+        """
+        Run fn(), hedging it if it is slow.
+
+        Args:
+            fn: Zero-argument idempotent read
+            deadline: Optional Deadline bounding the whole call
+
+        Returns:
+            The first successful result
+        """
+        delay = max(self.minimum_delay,
+                    self.tracker.percentile(self.percentile, self.initial_delay))
+        attempts = [self._executor.submit(self._timed, fn)]
+        done, _ = wait(attempts, timeout=_bounded(delay, deadline))
+        if not done:
+            if deadline is not None:
+                deadline.remaining()
+            self.hedged += 1
+            attempts.append(self._executor.submit(self._timed, fn))
+
+        error = None
+        pending = set(attempts)
+        while pending:
+            done, pending = wait(pending, timeout=_bounded(None, deadline),
+                                 return_when=FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceeded("Deadline exceeded waiting for hedged read")
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+
+def _bounded(seconds, deadline):
+    # Shorten a wait so it never runs past the deadline
+    if deadline is None:
+        return seconds
+    remaining = deadline.remaining()
+    if remaining is None:
+        return seconds
+    return remaining if seconds is None else min(seconds, remaining)
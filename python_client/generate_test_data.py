@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 import os
 import argparse
+from profiling import add_profile_arguments, start_profiling
 from approval_client import ApprovalClient
 import random
 import datetime
@@ -89,7 +90,9 @@ def main():
     parser.add_argument('--count', type=int, default=5, 
                         help='Number of test requests to generate')
     
+    add_profile_arguments(parser)
     args = parser.parse_args()
+    start_profiling(args)
     
     try:
         print(f"Initializing client with credentials from: {args.credentials}")
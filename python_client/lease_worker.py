@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+import argparse
+import importlib
+import multiprocessing
+import os
+import time
+from profiling import add_profile_arguments, start_profiling
+from approval_client import ApprovalClient, LeaseLostError
+
+
+def load_handler(spec):
+    """
+    Load a handler from a "module:function" spec.
+
+    The handler is called with (request_id, request_data) and returns
+    'approved', 'rejected', or None to release the request back to the queue.
+    """
+    module_name, _, function_name = spec.partition(':')
+    if not function_name:
+        raise ValueError(f"Handler must be given as module:function, got {spec}")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def _renew_all(client, leases, lease_seconds, worker_id):
+    # Renew every lease still held, dropping the ones already lost
+    renewed = []
+    for lease in leases:
+        try:
+            renewed.append(client.renew_lease(lease, lease_seconds))
+        except LeaseLostError as e:
+            print(f"[{worker_id}] {e}; skipping")
+        except Exception as e:
+            print(f"[{worker_id}] Error renewing lease on {lease.request_id}: {e}")
+            renewed.append(lease)
+    return renewed
+
+
+def run_worker(client, handler, worker_id, batch_size=10, lease_seconds=60,
+               idle_sleep=2, max_idle=None):
+    """
+    Lease pending requests and hand them to a handler until the queue stays empty.
+
+    Args:
+        client: The ApprovalClient instance
+        handler: Callable deciding a single request
+        worker_id: Identifier of this worker
+        batch_size: Requests leased per round trip
+        lease_seconds: Lease duration; all leases still held are renewed once half
+                       of it has passed
+        idle_sleep: Seconds to wait when no work is available
+        max_idle: Stop after this many consecutive empty polls (None runs forever)
+
+    Returns:
+        Number of requests decided by this worker
+    """
+    decided = 0
+    idle = 0
+    while max_idle is None or idle < max_idle:
+        leases = client.lease_pending(batch_size, lease_seconds, worker_id=worker_id)
+        if not leases:
+            idle += 1
+            time.sleep(idle_sleep)
+            continue
+        idle = 0
+        leased_at = time.monotonic()
+
+        while leases:
+            if time.monotonic() - leased_at > lease_seconds / 2:
+                # Renew the whole rest of the batch, not just the next lease, so
+                # none of them expires while earlier requests are handled
+                leases = _renew_all(client, leases, lease_seconds, worker_id)
+                leased_at = time.monotonic()
+                continue
+            lease = leases.pop(0)
+            try:
+                decision = handler(lease.request_id, lease.data)
+                if decision is None:
+                    client.release_lease(lease)
+                else:
+                    client.complete_lease(lease, decision)
+                    decided += 1
+            except LeaseLostError as e:
+                print(f"[{worker_id}] {e}; skipping")
+            except Exception as e:
+                print(f"[{worker_id}] Error processing request {lease.request_id}: {e}")
+                try:
+                    client.release_lease(lease)
+                except LeaseLostError:
+                    pass
+    return decided
+
+
+def _worker_main(credentials, handler_spec, worker_id, batch_size, lease_seconds, max_idle, results):
+    # Each process needs its own Firebase app and gRPC channel
+    client = ApprovalClient(credentials)
+    handler = load_handler(handler_spec)
+    results[worker_id] = run_worker(client, handler, worker_id, batch_size=batch_size,
+                                    lease_seconds=lease_seconds, max_idle=max_idle)
+
+
+def run_worker_pool(credentials, handler_spec, workers=4, batch_size=10, lease_seconds=60,
+                    max_idle=None):
+    """
+    Run a pool of worker processes that share the pending queue through leases.
+
+    Args:
+        credentials: Path to Firebase credentials JSON file
+        handler_spec: Handler given as "module:function"
+        workers: Number of worker processes
+        batch_size: Requests leased per round trip per worker
+        lease_seconds: Lease duration
+        max_idle: Stop each worker after this many consecutive empty polls
+
+    Returns:
+        Dict mapping worker ID to the number of requests it decided
+    """
+    load_handler(handler_spec)  # Fail fast on a bad spec before forking
+    with multiprocessing.Manager() as manager:
+        results = manager.dict()
+        processes = []
+        for i in range(workers):
+            worker_id = f"{os.uname().nodename}-{os.getpid()}-{i}"
+            process = multiprocessing.Process(
+                target=_worker_main,
+                args=(credentials, handler_spec, worker_id, batch_size, lease_seconds,
+                      max_idle, results)
+            )
+            process.start()
+            processes.append(process)
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
+        return dict(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a pool of automated approval workers')
+    parser.add_argument('--credentials', default='./service-account-key.json',
+                        help='Path to Firebase credentials JSON file')
+    parser.add_argument('--handler', required=True,
+                        help='Decision handler as module:function')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Number of worker processes')
+    parser.add_argument('--batch-size', type=int, default=10,
+                        help='Requests leased per round trip')
+    parser.add_argument('--lease-seconds', type=int, default=60,
+                        help='Lease duration in seconds')
+    parser.add_argument('--max-idle', type=int,
+                        help='Stop after this many consecutive empty polls (default: run forever)')
+
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    start_profiling(args)
+
+    try:
+        print(f"Starting {args.workers} workers with handler {args.handler}")
+        results = run_worker_pool(
+            credentials=args.credentials,
+            handler_spec=args.handler,
+            workers=args.workers,
+            batch_size=args.batch_size,
+            lease_seconds=args.lease_seconds,
+            max_idle=args.max_idle
+        )
+        for worker_id, decided in sorted(results.items()):
+            print(f"{worker_id}: decided {decided} requests")
+        print(f"Total decided: {sum(results.values())}")
+
+    except Exception as e:
+        print(f"Error: {e}")
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+import argparse
+import datetime
+import importlib
+import json
+import multiprocessing
+import os
+import queue
+import time
+from concurrent.futures import ProcessPoolExecutor
+from profiling import add_profile_arguments, start_profiling
+from approval_client import ApprovalClient
+
+
+# Built-in transforms. Each takes (snapshot, data) and returns a dict of field
+# updates, or None when the document is already migrated. They must be
+# idempotent: running one twice over the same document changes nothing the
+# second time, which is what makes resuming a partition safe.
+
+def add_decided_at(snapshot, data):
+    """Backfill decidedAt for decided requests from their last update time."""
+    if data.get('status', 'pending') == 'pending' or 'decidedAt' in data:
+        return None
+    return {'decidedAt': snapshot.update_time}
+
+
+def add_priority(snapshot, data):
+    """Give every request a default priority."""
+    if 'priority' in data:
+        return None
+    return {'priority': 'normal'}
+
+
+def normalize_requester_email(snapshot, data):
+    """Lower-case and trim requesterEmail."""
+    email = data.get('requesterEmail')
+    if not isinstance(email, str):
+        return None
+    normalized = email.strip().lower()
+    if normalized == email:
+        return None
+    return {'requesterEmail': normalized}
+
+
+def repair_created_at(snapshot, data):
+    """Set a missing or non-timestamp createdAt, which the Flutter app cannot parse."""
+    if isinstance(data.get('createdAt'), datetime.datetime):
+        return None
+    return {'createdAt': snapshot.create_time}
+
+
+TRANSFORMS = {
+    'add-decided-at': add_decided_at,
+    'add-priority': add_priority,
+    'normalize-requester-email': normalize_requester_email,
+    'repair-created-at': repair_created_at,
+}
+
+
+def load_transform(name):
+    """
+    Look up a built-in transform by name, or import one given as "module:function".
+    """
+    if name in TRANSFORMS:
+        return TRANSFORMS[name]
+    module_name, _, function_name = name.partition(':')
+    if not function_name:
+        raise ValueError(f"Unknown transform {name}; use one of {sorted(TRANSFORMS)} "
+                         "or module:function")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def plan_partitions(client, count):
+    """
+    Split the approvals collection into roughly equal ranges of document paths.
+
+    Returns:
+        List of partition dicts with 'start' and 'end' document paths (None for open ends)
+    """
+    partitions = []
+    for partition in client.db.collection_group('approvals').get_partitions(count):
+        partitions.append({
+            'start': _cursor_path(partition.start_at),
+            'end': _cursor_path(partition.end_at),
+        })
+    return partitions
+
+
+def _cursor_path(cursor):
+    # Partition cursors are document references, possibly wrapped as {'__name__': ref}
+    if cursor is None:
+        return None
+    if isinstance(cursor, dict):
+        cursor = cursor['__name__']
+    return cursor.path
+
+
+# Per-process state, set by _init_worker. Each process opens its own Firebase
+# app: gRPC channels must not be shared across processes.
+_client = None
+_transform = None
+
+
+def _init_worker(credentials, transform_name):
+    global _client, _transform
+    _client = ApprovalClient(credentials)
+    _transform = load_transform(transform_name)
+
+
+# google.rpc.Code.FAILED_PRECONDITION: the document changed after it was read
+FAILED_PRECONDITION = 9
+# Attempts per write for other (transient) errors before giving up on it
+MAX_WRITE_ATTEMPTS = 10
+# Rounds of re-reading and re-transforming documents whose writes failed
+CONFLICT_RETRIES = 3
+
+
+def _write_page(db, snapshots):
+    """
+    Transform and write one page of documents in bulk.
+
+    Writes carry a last-update-time precondition. Documents that changed after
+    they were read are re-read, re-transformed and written again, up to
+    CONFLICT_RETRIES times.
+
+    Returns:
+        Tuple of (documents updated, paths of documents whose writes failed)
+    """
+    updated = 0
+    for _ in range(CONFLICT_RETRIES + 1):
+        writer = db.bulk_writer()
+        failed = []
+
+        def on_write_error(error, _writer):
+            if error.code != FAILED_PRECONDITION and error.attempts < MAX_WRITE_ATTEMPTS:
+                return True
+            failed.append(error.operation.reference)
+            return False
+
+        writer.on_write_error(on_write_error)
+        written = 0
+        for snapshot in snapshots:
+            if not snapshot.exists:
+                continue
+            updates = _transform(snapshot, snapshot.to_dict() or {})
+            if updates:
+                written += 1
+                writer.update(snapshot.reference, updates,
+                              option=db.write_option(last_update_time=snapshot.update_time))
+        writer.close()
+
+        updated += written - len(failed)
+        if not failed:
+            return updated, []
+        snapshots = list(db.get_all(failed))
+    return updated, [ref.path for ref in failed]
+
+
+def _migrate_partition(index, partition, page_size, dry_run, progress):
+    db = _client.db
+    query = db.collection_group('approvals').order_by('__name__').limit(page_size)
+    if partition['end']:
+        query = query.end_before([db.document(partition['end'])])
+    resume_from = partition.get('last') or partition['start']
+    resume_inclusive = not partition.get('last')
+
+    processed = updated = 0
+    # Retry documents a previous run failed to write before moving on
+    previously_failed = [db.document(path) for path in partition.get('failed', [])]
+    if previously_failed and not dry_run:
+        page_updates, failed = _write_page(db, list(db.get_all(previously_failed)))
+        updated += page_updates
+        progress.put((index, None, 0, page_updates, failed, True, False))
+        if partition['done']:
+            progress.put((index, None, 0, 0, [], False, True))
+            return processed, updated
+
+    while True:
+        page = query
+        if resume_from:
+            cursor = [db.document(resume_from)]
+            page = page.start_at(cursor) if resume_inclusive else page.start_after(cursor)
+        snapshots = list(page.stream())
+        if not snapshots:
+            break
+
+        if dry_run:
+            page_updates = sum(1 for snapshot in snapshots
+                               if _transform(snapshot, snapshot.to_dict() or {}))
+            failed = []
+        else:
+            page_updates, failed = _write_page(db, snapshots)
+
+        processed += len(snapshots)
+        updated += page_updates
+        resume_from, resume_inclusive = snapshots[-1].reference.path, False
+        # Only report the cursor once the page's writes are flushed
+        progress.put((index, resume_from, len(snapshots), page_updates, failed, False, False))
+        if len(snapshots) < page_size:
+            break
+
+    progress.put((index, resume_from, 0, 0, [], False, True))
+    return processed, updated
+
+
+class MigrationCheckpoint:
+    def __init__(self, path, persist=True):
+        """
+        Per-partition migration progress persisted as JSON.
+
+        Args:
+            path: Path of the checkpoint file
+            persist: Read and write the file (False keeps progress in memory only)
+        """
+        self.path = path
+        self.persist = persist
+        self.state = None
+        if persist and os.path.exists(path):
+            with open(path) as f:
+                self.state = json.load(f)
+
+    def start(self, transform, partitions):
+        self.state = {
+            'transform': transform,
+            'partitions': [dict(partition, last=None, done=False, processed=0, updated=0,
+                                failed=[])
+                           for partition in partitions],
+        }
+        self.save()
+
+    def save(self):
+        if not self.persist:
+            return
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(temp_path, self.path)
+
+    def update(self, index, last, processed, updated, failed, retried, done):
+        partition = self.state['partitions'][index]
+        if last:
+            partition['last'] = last
+        partition['processed'] += processed
+        partition['updated'] += updated
+        # A retry of earlier failures replaces them; a new page adds to them
+        partition['failed'] = failed if retried else partition.get('failed', []) + failed
+        partition['done'] = partition['done'] or done
+
+    def totals(self):
+        partitions = self.state['partitions']
+        return (sum(p['processed'] for p in partitions),
+                sum(p['updated'] for p in partitions),
+                sum(1 for p in partitions if p['done']))
+
+    def failed(self):
+        return [path for p in self.state['partitions'] for path in p.get('failed', [])]
+
+
+def run_migration(credentials, transform_name, checkpoint_path, partitions=16, workers=None,
+                  page_size=500, dry_run=False, report_interval=5):
+    """
+    Apply a transform to every approval request across a process pool.
+
+    The collection is split with a partition query; each partition is processed
+    page by page by one worker process and its cursor is checkpointed after every
+    page. Rerunning with the same checkpoint file resumes unfinished partitions.
+
+    Documents changed by someone else while their page was being written are
+    re-read and re-transformed. Those that still cannot be written are kept in
+    the checkpoint, reported at the end and retried by the next run.
+
+    Args:
+        credentials: Path to Firebase credentials JSON file
+        transform_name: Built-in transform name or "module:function"
+        checkpoint_path: Path of the checkpoint file
+        partitions: Number of partitions to split the collection into
+        workers: Number of worker processes (defaults to the CPU count)
+        page_size: Documents read and written per page
+        dry_run: Count the documents that would change without writing
+        report_interval: Seconds between progress reports
+
+    Returns:
+        Tuple of (documents processed, documents updated)
+    """
+    load_transform(transform_name)  # Fail fast on a bad transform name
+    checkpoint = MigrationCheckpoint(checkpoint_path, persist=not dry_run)
+    if checkpoint.state is None:
+        client = ApprovalClient(credentials)
+        checkpoint.start(transform_name, plan_partitions(client, partitions))
+        print(f"Planned {len(checkpoint.state['partitions'])} partitions")
+    elif checkpoint.state['transform'] != transform_name:
+        raise ValueError(f"Checkpoint {checkpoint_path} belongs to transform "
+                         f"{checkpoint.state['transform']}")
+    else:
+        print(f"Resuming from checkpoint {checkpoint_path}")
+
+    remaining = [(i, partition) for i, partition in enumerate(checkpoint.state['partitions'])
+                 if not partition['done'] or (partition.get('failed') and not dry_run)]
+    start = time.time()
+    processed_at_start = checkpoint.totals()[0]
+
+    # Spawn rather than fork: the parent already holds a gRPC channel
+    context = multiprocessing.get_context('spawn')
+    with context.Manager() as manager:
+        progress = manager.Queue()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker,
+                                 initargs=(credentials, transform_name)) as executor:
+            futures = [executor.submit(_migrate_partition, i, partition, page_size, dry_run, progress)
+                       for i, partition in remaining]
+            last_report = time.time()
+            while not all(future.done() for future in futures) or not progress.empty():
+                try:
+                    checkpoint.update(*progress.get(timeout=0.5))
+                    checkpoint.save()
+                except queue.Empty:
+                    pass
+                if time.time() - last_report >= report_interval:
+                    last_report = time.time()
+                    processed, updated, done = checkpoint.totals()
+                    rate = (processed - processed_at_start) / (last_report - start)
+                    print(f"{processed} processed, {updated} updated, "
+                          f"{done}/{len(checkpoint.state['partitions'])} partitions done, "
+                          f"{rate:.0f} docs/sec")
+            for future in futures:
+                future.result()
+
+    processed, updated, done = checkpoint.totals()
+    elapsed = time.time() - start
+    print(f"Finished: {processed} processed, {updated} {'to update' if dry_run else 'updated'} "
+          f"in {elapsed:.1f}s ({(processed - processed_at_start) / max(elapsed, 1e-9):.0f} docs/sec)")
+    failed = checkpoint.failed()
+    if failed:
+        print(f"{len(failed)} documents could not be written (kept changing or write errors); "
+              f"rerun to retry them:")
+        for path in failed[:20]:
+            print(f"  {path}")
+        if len(failed) > 20:
+            print(f"  ... and {len(failed) - 20} more")
+    return processed, updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a partitioned migration over approval requests')
+    parser.add_argument('--credentials', default='./service-account-key.json',
+                        help='Path to Firebase credentials JSON file')
+    parser.add_argument('--transform', required=True,
+                        help=f"Transform to apply: one of {', '.join(sorted(TRANSFORMS))} "
+                             "or module:function")
+    parser.add_argument('--checkpoint',
+                        help='Checkpoint file (default: migration-<transform>.json)')
+    parser.add_argument('--partitions', type=int, default=16,
+                        help='Number of partitions to split the collection into')
+    parser.add_argument('--workers', type=int,
+                        help='Number of worker processes (default: CPU count)')
+    parser.add_argument('--page-size', type=int, default=500,
+                        help='Documents per read/write page')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Count documents that would change without writing')
+
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    start_profiling(args)
+
+    checkpoint = args.checkpoint or f"migration-{args.transform.replace(':', '-')}.json"
+    try:
+        run_migration(
+            credentials=args.credentials,
+            transform_name=args.transform,
+            checkpoint_path=checkpoint,
+            partitions=args.partitions,
+            workers=args.workers,
+            page_size=args.page_size,
+            dry_run=args.dry_run
+        )
+    except Exception as e:
+        print(f"Error: {e}")
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
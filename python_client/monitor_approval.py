@@ -1,10 +1,12 @@
 #!/usr/bin/env python3
 import argparse
 import time
+from profiling import add_profile_arguments, start_profiling
 from approval_client import ApprovalClient
+from deadlines import Cancelled, Deadline, DeadlineExceeded
 import sys
 
-def monitor_request_status(client, request_id, interval=5, timeout=300):
+def monitor_request_status(client, request_id, interval=5, timeout=300, deadline=None):
     """
     Monitor the status of an approval request until it changes from 'pending'
     
@@ -13,10 +15,23 @@ def monitor_request_status(client, request_id, interval=5, timeout=300):
         request_id: ID of the request to monitor
         interval: Polling interval in seconds
         timeout: Maximum time to wait in seconds
+        deadline: Optional Deadline to use instead of timeout; cancelling it
+                  from another thread stops monitoring promptly
         
     Returns:
         Final status of the request or None if timed out
     """
+    deadline = deadline or Deadline(timeout)
+    try:
+        return _monitor(client, request_id, interval, timeout, deadline)
+    except DeadlineExceeded:
+        print("\n⏰ Timeout reached. Request is still pending.")
+        return 'timeout'
+    except Cancelled:
+        print("\nMonitoring cancelled.")
+        return 'cancelled'
+
+def _monitor(client, request_id, interval, timeout, deadline):
     print(f"Monitoring request {request_id} for status changes...")
     print(f"Will check every {interval} seconds (timeout after {timeout} seconds)")
     
@@ -24,7 +39,7 @@ def monitor_request_status(client, request_id, interval=5, timeout=300):
     elapsed = 0
     
     while elapsed < timeout:
-        status = client.check_request_status(request_id)
+        status = client.check_request_status(request_id, deadline=deadline)
         
         if status is None:
             print("Request not found. Exiting.")
@@ -44,7 +59,8 @@ def monitor_request_status(client, request_id, interval=5, timeout=300):
         sys.stdout.write(f"\rWaiting for approval [{bar}] {progress:.1f}% ({elapsed:.0f}s)")
         sys.stdout.flush()
         
-        time.sleep(interval)
+        deadline.wait(interval)
+        deadline.remaining()  # Raises once the deadline passes or monitoring is cancelled
         elapsed = time.time() - start_time
     
     print("\n⏰ Timeout reached. Request is still pending.")
@@ -53,7 +69,8 @@ def monitor_request_status(client, request_id, interval=5, timeout=300):
 def create_and_monitor_request(client, title, description, requester_id, requester_email, 
                               interval=5, timeout=300):
     """
-    Create a new approval request and monitor its status
+    Create a new approval request and monitor its status. The timeout covers
+    the create as well as the monitoring.
     
     Args:
         client: The ApprovalClient instance
@@ -67,13 +84,15 @@ def create_and_monitor_request(client, title, description, requester_id, request
     Returns:
         Tuple of (request_id, final_status)
     """
+    deadline = Deadline(timeout)
     try:
         # Create the request
         request_id = client.create_approval_request(
             title=title,
             description=description,
             requester_id=requester_id,
-            requester_email=requester_email
+            requester_email=requester_email,
+            deadline=deadline
         )
         
         if not request_id:
@@ -89,11 +108,15 @@ def create_and_monitor_request(client, title, description, requester_id, request
             client=client,
             request_id=request_id,
             interval=interval,
-            timeout=timeout
+            timeout=timeout,
+            deadline=deadline
         )
         
         return request_id, final_status
         
+    except DeadlineExceeded:
+        print("\n⏰ Timeout reached before the request was created.")
+        return None, 'timeout'
     except Exception as e:
         print(f"Error creating or monitoring request: {e}")
         return None, None
@@ -115,7 +138,9 @@ def main():
     parser.add_argument('--timeout', type=int, default=300,
                         help='Maximum time to wait in seconds')
     
+    add_profile_arguments(parser)
     args = parser.parse_args()
+    start_profiling(args)
     
     try:
         print(f"Initializing client with credentials from: {args.credentials}")
@@ -0,0 +1,108 @@
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+
+TRACE_VERSION = 1
+
+
+class TraceRecorder:
+    def __init__(self, path):
+        """
+        Record a compact trace of client operations to a JSON Lines file.
+
+        Each line holds the start offset, duration, operation type, issuing
+        thread, an anonymized document key and the payload size. Document and
+        requester IDs are hashed with a per-trace random salt that is never
+        written, so the trace can be shared without exposing real IDs while
+        still linking a create to the checks that follow it.
+
+        Args:
+            path: Path of the trace file to write
+        """
+        self.path = path
+        self._salt = os.urandom(16)
+        self._lock = threading.Lock()
+        self._threads = {}
+        self._start = time.perf_counter()
+        self._file = open(path, 'w', buffering=1024 * 1024)
+        self._file.write(json.dumps({'v': TRACE_VERSION, 'start': time.time()}) + '\n')
+        atexit.register(self.close)
+
+    def anonymize(self, value):
+        if value is None:
+            return None
+        return hashlib.blake2b(str(value).encode('utf-8'), key=self._salt, digest_size=6).hexdigest()
+
+    def record(self, op, started, duration, ok=True, key=None, size=0):
+        """
+        Append one operation to the trace.
+
+        Args:
+            op: Operation type, e.g. 'create' or 'check'
+            started: time.perf_counter() value when the operation began
+            duration: Duration in seconds
+            ok: Whether the operation succeeded
+            key: Document ID the operation touched (anonymized before writing)
+            size: Payload size in bytes
+        """
+        thread = threading.get_ident()
+        with self._lock:
+            if self._file is None:
+                return
+            thread_index = self._threads.setdefault(thread, len(self._threads))
+            entry = {
+                't': round(started - self._start, 6),
+                'op': op,
+                'd': round(duration, 6),
+                'th': thread_index,
+            }
+            if key is not None:
+                entry['k'] = self.anonymize(key)
+            if size:
+                entry['sz'] = size
+            if not ok:
+                entry['ok'] = 0
+            self._file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def load_trace(path):
+    """
+    Read a trace file.
+
+    Returns:
+        Tuple of (header dict, list of operation dicts ordered by start offset)
+    """
+    with open(path) as f:
+        header = json.loads(f.readline())
+        if header.get('v') != TRACE_VERSION:
+            raise ValueError(f"Unsupported trace version {header.get('v')}")
+        operations = [json.loads(line) for line in f if line.strip()]
+    operations.sort(key=lambda entry: entry['t'])
+    return header, operations
+
+
+def percentiles(values, points=(50, 90, 95, 99)):
+    """
+    Nearest-rank percentiles of a list of numbers.
+
+    Returns:
+        Dict mapping 'p50', 'p90', ... and 'max' to values (empty if no values)
+    """
+    if not values:
+        return {}
+    ordered = sorted(values)
+    result = {}
+    for point in points:
+        rank = max(0, min(len(ordered) - 1, int(round(point / 100 * len(ordered))) - 1))
+        result[f"p{point}"] = ordered[rank]
+    result['max'] = ordered[-1]
+    return result
@@ -0,0 +1,337 @@
+import atexit
+import cProfile
+import functools
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+# When this module was first imported. Entry points import it before anything
+# heavy, so the 'imports' phase covers firebase_admin, grpc and friends.
+_IMPORTED_AT = (time.perf_counter(), time.thread_time())
+_imports_done = None
+
+# The profiler started from the command line, if any
+_active = None
+
+COLLAPSED_EXTENSIONS = ('.folded', '.collapsed')
+
+
+class _Phase:
+    __slots__ = ('profiler', 'name')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler._push(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler._pop()
+        return False
+
+
+class _NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _TimedStream:
+    """Stream wrapper that books time spent writing to the 'output' phase."""
+
+    def __init__(self, profiler, stream):
+        self._profiler = profiler
+        self._stream = stream
+
+    def write(self, text):
+        with self._profiler.phase('output'):
+            return self._stream.write(text)
+
+    def flush(self):
+        with self._profiler.phase('output'):
+            return self._stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def _column(value, fmt='.1f', width=10):
+    if value is None:
+        return f"{'-':>{width}}"
+    return f"{value:>{width}{fmt}}"
+
+
+class Profiler:
+    def __init__(self, cprofile=False, sample_interval=None):
+        """
+        Per-phase wall and CPU time accounting, with optional cProfile or
+        stack sampling.
+
+        Phases nest: time is booked to the innermost open phase of each thread,
+        so an 'output' phase inside an 'rpc' phase is not counted twice. CPU
+        time is per thread. Whatever no phase claims is reported as 'other'.
+
+        Args:
+            cprofile: Run cProfile on the thread that calls start()
+            sample_interval: If set, sample the stacks of all threads every this
+                             many seconds, for collapsed-stack (flamegraph) output
+        """
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.wall = defaultdict(float)
+        self.cpu = defaultdict(float)
+        self.calls = Counter()
+        self.samples = Counter()
+        self.cprofile = cProfile.Profile() if cprofile else None
+        self.sample_interval = sample_interval
+        self._sampler = None
+        self._stopped = threading.Event()
+        self.started = None
+        self.stopped = None
+
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+
+    def _charge(self, stack, now_wall, now_cpu):
+        name, since_wall, since_cpu = stack[-1]
+        with self._lock:
+            self.wall[name] += now_wall - since_wall
+            self.cpu[name] += now_cpu - since_cpu
+
+    def _push(self, name):
+        now_wall, now_cpu = time.perf_counter(), time.thread_time()
+        stack = self._stack()
+        if stack:
+            # Pause the enclosing phase
+            self._charge(stack, now_wall, now_cpu)
+        stack.append((name, now_wall, now_cpu))
+        with self._lock:
+            self.calls[name] += 1
+
+    def _pop(self):
+        now_wall, now_cpu = time.perf_counter(), time.thread_time()
+        stack = self._stack()
+        self._charge(stack, now_wall, now_cpu)
+        stack.pop()
+        if stack:
+            # Resume the enclosing phase
+            name = stack[-1][0]
+            stack[-1] = (name, now_wall, now_cpu)
+
+    def phase(self, name):
+        """
+        Context manager booking the time spent inside it to the phase `name`.
+        """
+        return _Phase(self, name)
+
+    def record(self, name, wall, cpu=0.0):
+        """
+        Book an already measured interval to a phase.
+        """
+        with self._lock:
+            self.wall[name] += wall
+            self.cpu[name] += cpu
+            self.calls[name] += 1
+
+    def wrap(self, obj, methods=None, prefix=None):
+        """
+        Time calls to an object's methods, e.g. an ApprovalClient, each under its
+        own phase. The methods are replaced on the instance only.
+
+        Args:
+            obj: Object whose methods to wrap
+            methods: Method names to wrap. Defaults to every public method.
+            prefix: Phase name prefix. Defaults to the class name.
+
+        Returns:
+            obj
+        """
+        prefix = prefix or type(obj).__name__
+        if methods is None:
+            methods = [name for name in dir(obj)
+                       if not name.startswith('_') and callable(getattr(obj, name, None))]
+        for name in methods:
+            method = getattr(obj, name)
+            setattr(obj, name, self.wrap_function(method, f"{prefix}.{name}"))
+        return obj
+
+    def wrap_function(self, function, name=None):
+        """
+        Return a version of `function` whose calls are timed under phase `name`.
+        """
+        name = name or getattr(function, '__qualname__', repr(function))
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with self.phase(name):
+                return function(*args, **kwargs)
+        return wrapper
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while not self._stopped.wait(self.sample_interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:"
+                                  f"{code.co_firstlineno})".replace(';', ':'))
+                    frame = frame.f_back
+                self.samples[';'.join(reversed(frames))] += 1
+
+    def start(self):
+        """
+        Start timing. The first profiler started also receives the phases
+        booked through profile_phase(), e.g. the ApprovalClient's own phases.
+        """
+        global _active
+        if _active is None:
+            _active = self
+        self.started = time.perf_counter()
+        if self.cprofile is not None:
+            self.cprofile.enable()
+        if self.sample_interval:
+            self._sampler = threading.Thread(target=self._sample_loop, name='profile-sampler',
+                                             daemon=True)
+            self._sampler.start()
+        return self
+
+    def stop(self):
+        global _active
+        if self.stopped is not None:
+            return
+        self.stopped = time.perf_counter()
+        if _active is self:
+            _active = None
+        if self.cprofile is not None:
+            self.cprofile.disable()
+        if self._sampler is not None:
+            self._stopped.set()
+            self._sampler.join()
+        # Close phases still open on this thread, e.g. after an exception
+        stack = self._stack()
+        while stack:
+            self._pop()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def report(self, total=None):
+        """
+        Format the per-phase breakdown as a table.
+
+        Args:
+            total: Wall time in seconds the phases are part of. Defaults to the
+                   time between start() and stop().
+        """
+        if total is None:
+            total = (self.stopped or time.perf_counter()) - self.started
+        with self._lock:
+            rows = [(name, self.calls[name], self.wall[name], self.cpu[name]) for name in self.wall]
+        claimed = sum(wall for _, _, wall, _ in rows)
+        rows.sort(key=lambda row: row[2], reverse=True)
+        rows.append(('other', None, max(0.0, total - claimed), None))
+        width = max([32] + [len(name) + 1 for name, _, _, _ in rows])
+        lines = [f"{'phase':<{width}} {'calls':>7} {'wall ms':>10} {'cpu ms':>10} {'wall %':>7}"]
+        for name, calls, wall, cpu in rows:
+            lines.append(f"{name:<{width}} {_column(calls, 'd', 7)} {_column(wall * 1000)} "
+                         f"{_column(cpu if cpu is None else cpu * 1000)} "
+                         f"{100 * wall / total if total else 0:>6.1f}%")
+        lines.append(f"{'total':<{width}} {'':>7} {_column(total * 1000)} "
+                     f"{_column(time.process_time() * 1000)} (process CPU)")
+        return '\n'.join(lines)
+
+    def write_output(self, path):
+        """
+        Write cProfile statistics (pstats format) or, for .folded/.collapsed
+        paths, the sampled stacks in collapsed format for flamegraph tools.
+        """
+        if path.endswith(COLLAPSED_EXTENSIONS):
+            with open(path, 'w') as f:
+                for stack, count in sorted(self.samples.items()):
+                    f.write(f"{stack} {count}\n")
+        elif self.cprofile is not None:
+            self.cprofile.dump_stats(path)
+
+
+def profile_phase(name):
+    """
+    Book the time spent in a `with` block to a phase of the active profiler.
+    Costs next to nothing when profiling is off.
+    """
+    if _active is None:
+        return _NULL_PHASE
+    return _active.phase(name)
+
+
+def profiling_active():
+    return _active is not None
+
+
+def add_profile_arguments(parser):
+    """
+    Add the shared --profile options to a command-line parser.
+    """
+    global _imports_done
+    if _imports_done is None:
+        # The parser is built once the entry point's imports have finished
+        _imports_done = (time.perf_counter(), time.thread_time())
+    parser.add_argument('--profile', action='store_true',
+                        help='Print a per-phase wall/CPU time breakdown to stderr on exit')
+    parser.add_argument('--profile-output',
+                        help='Also write profile data: cProfile stats (e.g. run.pstats), or '
+                             'collapsed stacks for flamegraphs if the name ends in .folded')
+    parser.add_argument('--profile-interval', type=float, default=0.002,
+                        help='Stack sampling interval in seconds for .folded output')
+
+
+def start_profiling(args):
+    """
+    Start profiling if --profile or --profile-output was given. The report is
+    printed to stderr, and the output file written, when the process exits.
+
+    Returns:
+        The Profiler, or None if profiling is off
+    """
+    output = getattr(args, 'profile_output', None)
+    if not getattr(args, 'profile', False) and not output:
+        return None
+    collapsed = bool(output) and output.endswith(COLLAPSED_EXTENSIONS)
+    profiler = Profiler(cprofile=bool(output) and not collapsed,
+                        sample_interval=args.profile_interval if collapsed else None)
+    imports_done = _imports_done or (time.perf_counter(), time.thread_time())
+    profiler.record('imports', imports_done[0] - _IMPORTED_AT[0], imports_done[1] - _IMPORTED_AT[1])
+    profiler.start()
+    profiler.started = _IMPORTED_AT[0]
+    sys.stdout = _TimedStream(profiler, sys.stdout)
+    atexit.register(_finish, profiler, output)
+    return profiler
+
+
+def _finish(profiler, output):
+    profiler.stop()
+    if isinstance(sys.stdout, _TimedStream):
+        sys.stdout.flush()
+        sys.stdout = sys.stdout._stream
+    print(profiler.report(), file=sys.stderr)
+    if output:
+        profiler.write_output(output)
+        print(f"Profile data written to {output}", file=sys.stderr)
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+import argparse
+import datetime
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from profiling import add_profile_arguments, start_profiling
+from approval_client import ApprovalClient, Lease
+from operation_trace import load_trace, percentiles
+
+
+class InMemoryApprovalClient:
+    def __init__(self):
+        """
+        In-process stand-in for ApprovalClient, used to replay traces without a
+        backend so that only client-side overhead and scheduling are measured.
+        """
+        self.trace = None
+        self._lock = threading.Lock()
+        self._requests = {}
+
+    def create_approval_request(self, title, description, requester_id, requester_email):
+        request_id = uuid.uuid4().hex[:20]
+        with self._lock:
+            self._requests[request_id] = {
+                'title': title,
+                'description': description,
+                'requesterId': requester_id,
+                'requesterEmail': requester_email,
+                'createdAt': datetime.datetime.now(datetime.timezone.utc),
+                'status': 'pending',
+            }
+        return request_id
+
+    def check_request_status(self, request_id, deadline=None):
+        with self._lock:
+            data = self._requests.get(request_id)
+            return data['status'] if data else None
+
+    def lease_pending(self, n, lease_seconds=60, worker_id=None, requester_id=None):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        expires_at = now + datetime.timedelta(seconds=lease_seconds)
+        leases = []
+        with self._lock:
+            for request_id, data in self._requests.items():
+                if len(leases) >= n:
+                    break
+                if requester_id is not None and data['requesterId'] != requester_id:
+                    continue
+                if data['status'] != 'pending' or data.get('leaseExpiresAt', now) > now:
+                    continue
+                token = uuid.uuid4().hex
+                data.update(leaseToken=token, leaseExpiresAt=expires_at)
+                leases.append(Lease(request_id, token, worker_id, expires_at, dict(data)))
+        return leases
+
+    def renew_lease(self, lease, lease_seconds=60):
+        expires_at = (datetime.datetime.now(datetime.timezone.utc)
+                      + datetime.timedelta(seconds=lease_seconds))
+        with self._lock:
+            self._requests[lease.request_id]['leaseExpiresAt'] = expires_at
+        return lease._replace(expires_at=expires_at)
+
+    def release_lease(self, lease):
+        with self._lock:
+            self._requests[lease.request_id].pop('leaseExpiresAt', None)
+
+    def complete_lease(self, lease, status):
+        with self._lock:
+            data = self._requests[lease.request_id]
+            data.pop('leaseExpiresAt', None)
+            data['status'] = status
+
+
+class TraceReplayer:
+    def __init__(self, client, operations, speed=1.0):
+        """
+        Re-issue recorded operations against a client.
+
+        Operations keep their recorded start offsets (divided by speed) and their
+        issuing thread: each recorded thread gets its own replay thread, so the
+        original concurrency and per-thread ordering are preserved. Requests
+        created during the replay stand in for the anonymized keys of the trace,
+        so later checks hit the documents created earlier in the replay. They
+        are created under a requester ID unique to this replay, and leases only
+        claim those requests, so a replay never decides anyone else's requests.
+
+        Args:
+            client: ApprovalClient or InMemoryApprovalClient to replay against
+            operations: Operation dicts from load_trace
+            speed: Replay speed multiplier (e.g. 10 replays 10x faster)
+        """
+        self.client = client
+        self.operations = operations
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._ids = {}
+        self._leases = []
+        self.requester_id = f"replay-{uuid.uuid4().hex[:12]}"
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.lag = []
+
+    def _issue(self, op):
+        kind = op['op']
+        key = op.get('k')
+        if kind == 'create':
+            # Pad the description so the payload matches the recorded size
+            fixed = ('Replayed request', self.requester_id, 'replay@example.com')
+            padding = max(0, op.get('sz', 0) - sum(len(value) for value in fixed))
+            request_id = self.client.create_approval_request(
+                title=fixed[0],
+                description='x' * padding,
+                requester_id=fixed[1],
+                requester_email=fixed[2]
+            )
+            with self._lock:
+                self._ids[key] = request_id
+        elif kind == 'check':
+            with self._lock:
+                request_id = self._ids.get(key, key or 'missing')
+            self.client.check_request_status(request_id)
+        elif kind == 'lease':
+            leases = self.client.lease_pending(max(1, op.get('sz', 1)),
+                                               requester_id=self.requester_id)
+            with self._lock:
+                self._leases.extend(leases)
+        elif kind in ('renew', 'release', 'complete'):
+            with self._lock:
+                lease = self._leases.pop() if self._leases else None
+            if lease is None:
+                return
+            if kind == 'renew':
+                lease = self.client.renew_lease(lease)
+                with self._lock:
+                    self._leases.append(lease)
+            elif kind == 'release':
+                self.client.release_lease(lease)
+            else:
+                self.client.complete_lease(lease, 'approved')
+
+    def _run_thread(self, operations, origin):
+        for op in operations:
+            target = origin + op['t'] / self.speed
+            delay = target - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            started = time.perf_counter()
+            try:
+                self._issue(op)
+            except Exception:
+                with self._lock:
+                    self.errors[op['op']] += 1
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                self.latencies[op['op']].append(elapsed)
+                self.lag.append(max(0.0, started - target))
+
+    def run(self):
+        """
+        Replay the trace and block until every operation has been issued.
+
+        Returns:
+            Wall-clock duration of the replay in seconds
+        """
+        by_thread = defaultdict(list)
+        for op in self.operations:
+            by_thread[op.get('th', 0)].append(op)
+
+        origin = time.perf_counter() + 0.1
+        threads = [threading.Thread(target=self._run_thread, args=(ops, origin), daemon=True)
+                   for ops in by_thread.values()]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - origin
+
+    def report(self):
+        """
+        Replayed latency percentiles per operation, next to the recorded ones.
+        """
+        recorded = defaultdict(list)
+        for op in self.operations:
+            recorded[op['op']].append(op['d'])
+        return {
+            kind: {
+                'count': len(values),
+                'errors': self.errors.get(kind, 0),
+                'replayed': percentiles(values),
+                'recorded': percentiles(recorded.get(kind, [])),
+            }
+            for kind, values in sorted(self.latencies.items())
+        }
+
+
+def _format_ms(stats):
+    if not stats:
+        return '-'
+    return '  '.join(f"{name}={value * 1000:.1f}" for name, value in stats.items())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay a recorded ApprovalClient trace')
+    parser.add_argument('trace', help='Trace file recorded with --trace / trace_path')
+    parser.add_argument('--credentials', default='./service-account-key.json',
+                        help='Path to Firebase credentials JSON file')
+    parser.add_argument('--backend', choices=['firestore', 'memory'], default='firestore',
+                        help='Replay against the Firestore emulator or an in-memory backend')
+    parser.add_argument('--emulator',
+                        help='Firestore emulator host:port (sets FIRESTORE_EMULATOR_HOST)')
+    parser.add_argument('--transport', choices=['grpc', 'rest'], default='grpc',
+                        help='Firestore transport to replay through (REST supports create and check only)')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='Replay speed multiplier, 1 to 100')
+
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    start_profiling(args)
+
+    if not 1.0 <= args.speed <= 100.0:
+        print("Error: --speed must be between 1 and 100")
+        return 1
+
+    try:
+        header, operations = load_trace(args.trace)
+        print(f"Loaded {len(operations)} operations recorded at "
+              f"{datetime.datetime.fromtimestamp(header['start']).isoformat()}")
+
+        if args.backend == 'memory':
+            client = InMemoryApprovalClient()
+        else:
+            if args.emulator:
+                os.environ['FIRESTORE_EMULATOR_HOST'] = args.emulator
+            if not os.environ.get('FIRESTORE_EMULATOR_HOST'):
+                # A replay creates, leases and approves requests; never do that
+                # to a real project
+                print("Error: replaying against Firestore needs --emulator or "
+                      "FIRESTORE_EMULATOR_HOST; use --backend=memory otherwise")
+                return 1
+            client = ApprovalClient(args.credentials, transport=args.transport)
+
+        replayer = TraceReplayer(client, operations, speed=args.speed)
+        print(f"Replaying at {args.speed:g}x against "
+              f"{os.environ.get('FIRESTORE_EMULATOR_HOST') if args.backend == 'firestore' else args.backend}...")
+        wall = replayer.run()
+
+        print(f"\nReplayed {len(operations)} operations in {wall:.2f}s "
+              f"({len(operations) / wall if wall > 0 else 0:.1f} ops/s)")
+        print(f"Schedule lag (ms): {_format_ms(percentiles(replayer.lag))}")
+        for kind, stats in replayer.report().items():
+            print(f"\n{kind}: {stats['count']} ops, {stats['errors']} errors")
+            print(f"  replayed (ms): {_format_ms(stats['replayed'])}")
+            print(f"  recorded (ms): {_format_ms(stats['recorded'])}")
+
+    except Exception as e:
+        print(f"Error: {e}")
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,334 @@
+import datetime
+import json
+import os
+import secrets
+import string
+import sys
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: new_request_id() still works, the spool itself does not
+    fcntl = None
+
+# Same alphabet and length as Firestore auto-generated document IDs
+ID_ALPHABET = string.ascii_letters + string.digits
+ID_LENGTH = 20
+
+# Firestore limit on writes per batch
+MAX_BATCH = 500
+
+
+def new_request_id():
+    return ''.join(secrets.choice(ID_ALPHABET) for _ in range(ID_LENGTH))
+
+
+class RequestSpool:
+    def __init__(self, path, fsync_interval=0.01):
+        """
+        Durable append-only spool of approval requests waiting to be written.
+
+        Records are appended as JSON lines. Appends are group-committed: a
+        background thread fsyncs the file every fsync_interval, and each append
+        returns once the fsync covering it has completed, so one fsync makes
+        many concurrent appends durable. The byte offset of the first record not
+        yet written to Firestore is kept in "<path>.offset". A record left
+        incomplete by a crash mid-append is cut off when the spool is opened.
+
+        Args:
+            path: Path of the spool file
+            fsync_interval: Seconds between group fsyncs
+        """
+        if fcntl is None:
+            raise ValueError("The request spool needs fcntl file locking, which this platform lacks")
+        self.path = path
+        self.offset_path = path + '.offset'
+        self.lock_path = path + '.lock'
+        self.fsync_interval = fsync_interval
+        self._file = open(path, 'ab', buffering=0)
+        self._lock_file = open(self.lock_path, 'a')
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        try:
+            self._truncate_partial_record()
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        self._cond = threading.Condition()
+        self._written = 0
+        self._synced = 0
+        self._closed = False
+        self._syncer = threading.Thread(target=self._sync_loop, name='spool-fsync', daemon=True)
+        self._syncer.start()
+
+    def _truncate_partial_record(self):
+        # A crash mid-append leaves a record without its newline, and the next
+        # append would be glued onto it. Must hold the exclusive lock, so no
+        # append is in progress.
+        with open(self.path, 'rb+') as f:
+            end = f.seek(0, os.SEEK_END)
+            position = end
+            while position > 0:
+                step = min(4096, position)
+                f.seek(position - step)
+                newline = f.read(step).rfind(b'\n')
+                if newline != -1:
+                    position += newline + 1 - step
+                    break
+                position -= step
+            if position < end:
+                f.truncate(position)
+                os.fsync(f.fileno())
+                print(f"Discarded {end - position} bytes of an incomplete record at the end "
+                      f"of spool {self.path}", file=sys.stderr)
+
+    def _sync_loop(self):
+        while True:
+            with self._cond:
+                while self._written == self._synced and not self._closed:
+                    self._cond.wait()
+                if self._closed and self._written == self._synced:
+                    return
+            time.sleep(self.fsync_interval)  # Let more appends join this fsync
+            with self._cond:
+                target = self._written
+            os.fsync(self._file.fileno())
+            with self._cond:
+                self._synced = target
+                self._cond.notify_all()
+
+    def append(self, title, description, requester_id, requester_email, durable=True):
+        """
+        Spool a new request and return its client-assigned ID.
+
+        Args:
+            title: Title of the request
+            description: Detailed description of the request
+            requester_id: ID or identifier of the requester
+            requester_email: Email of the requester
+            durable: Wait until the record has been fsynced
+
+        Returns:
+            Document ID the request will be written under
+        """
+        request_id = new_request_id()
+        record = {
+            'id': request_id,
+            'title': title,
+            'description': description,
+            'requesterId': requester_id,
+            'requesterEmail': requester_email,
+            'requestedAt': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        }
+        line = (json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8')
+        # Shared lock: many appenders at once, but never during compaction
+        fcntl.flock(self._lock_file, fcntl.LOCK_SH)
+        try:
+            # O_APPEND: one write per record, never interleaved
+            written = self._file.write(line)
+            if written != len(line):
+                raise OSError(f"Short write to spool {self.path}: {written} of {len(line)} bytes")
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        with self._cond:
+            self._written += 1
+            ticket = self._written
+            self._cond.notify_all()
+            while durable and self._synced < ticket:
+                self._cond.wait()
+        return request_id
+
+    def read_offset(self):
+        try:
+            with open(self.offset_path) as f:
+                return int(f.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _write_offset(self, offset):
+        temp_path = self.offset_path + '.tmp'
+        with open(temp_path, 'w') as f:
+            f.write(str(offset))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.offset_path)
+
+    def pending(self, limit=None):
+        """
+        Read records not yet written to Firestore.
+
+        Returns:
+            List of (record, end offset) tuples in spool order
+        """
+        records = []
+        with open(self.path, 'rb') as f:
+            f.seek(self.read_offset())
+            offset = f.tell()
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # A record still being appended
+                offset += len(line)
+                records.append((json.loads(line), offset))
+                if limit is not None and len(records) >= limit:
+                    break
+        return records
+
+    def contains(self, request_id):
+        return any(record['id'] == request_id for record, _ in self.pending())
+
+    def status(self):
+        records = self.pending()
+        oldest = _requested_at(records[0][0]) if records else None
+        return {
+            'path': self.path,
+            'size': os.path.getsize(self.path),
+            'offset': self.read_offset(),
+            'pending': len(records),
+            'oldest': oldest,
+        }
+
+    def acknowledge(self, offset):
+        """
+        Record that everything before offset is in Firestore, compacting the
+        spool once it is fully drained.
+        """
+        self._write_offset(offset)
+        fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+        try:
+            if os.path.getsize(self.path) == offset:
+                # Reset the offset first: a crash in between only replays
+                # records that already exist, which flushing tolerates
+                self._write_offset(0)
+                os.truncate(self.path, 0)
+        finally:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._syncer.join()
+        self._file.close()
+        self._lock_file.close()
+
+
+def _requested_at(record):
+    # Spools written by earlier versions called this field createdAt
+    return record.get('requestedAt') or record['createdAt']
+
+
+def _to_document(record, server_timestamp):
+    return {
+        'title': record['title'],
+        'description': record['description'],
+        'requesterId': record['requesterId'],
+        'requesterEmail': record['requesterEmail'],
+        # createdAt is the write time, so queries on createdAt > checkpoint (the
+        # mirror and change feed catch-ups) see flushed requests; the time the
+        # producer made the request is kept separately
+        'createdAt': server_timestamp,
+        'requestedAt': datetime.datetime.fromisoformat(_requested_at(record)),
+        'status': 'pending',
+    }
+
+
+def flush_spool(spool, db, batch_size=MAX_BATCH):
+    """
+    Write spooled requests to Firestore in order, one batch at a time.
+
+    Batches are committed sequentially in spool order, so requests from the
+    same requester reach Firestore in the order they were made. Documents are
+    created under their client-assigned IDs, which makes replaying a batch
+    after a crash harmless.
+
+    Args:
+        spool: The RequestSpool to drain
+        db: Firestore client
+        batch_size: Requests per batch (at most 500)
+
+    Returns:
+        Number of requests written
+    """
+    # Imported here so that spooling alone never loads the gRPC stack
+    from firebase_admin import firestore
+    from google.api_core import exceptions as google_exceptions
+
+    # Only one flusher per spool at a time, across processes
+    flusher_lock = open(spool.path + '.flush-lock', 'a')
+    fcntl.flock(flusher_lock, fcntl.LOCK_EX)
+    try:
+        written = 0
+        collection = db.collection('approvals')
+        while True:
+            records = spool.pending(limit=min(batch_size, MAX_BATCH))
+            if not records:
+                return written
+            batch = db.batch()
+            for record, _ in records:
+                batch.create(collection.document(record['id']), _to_document(record, firestore.SERVER_TIMESTAMP))
+            try:
+                batch.commit()
+            except google_exceptions.AlreadyExists:
+                # Part of this batch was written before a crash; create one by one
+                for record, _ in records:
+                    try:
+                        collection.document(record['id']).create(
+                            _to_document(record, firestore.SERVER_TIMESTAMP))
+                    except google_exceptions.AlreadyExists:
+                        pass
+            spool.acknowledge(records[-1][1])
+            written += len(records)
+    finally:
+        fcntl.flock(flusher_lock, fcntl.LOCK_UN)
+        flusher_lock.close()
+
+
+class SpoolFlusher:
+    def __init__(self, spool, db, interval=0.5, max_backoff=60):
+        """
+        Background thread draining a RequestSpool into Firestore with retries.
+
+        Args:
+            spool: The RequestSpool to drain
+            db: Firestore client
+            interval: Seconds between drain attempts when the backend is healthy
+            max_backoff: Upper bound in seconds on the retry delay after failures
+        """
+        self.spool = spool
+        self.db = db
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.failures = 0
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='spool-flusher', daemon=True)
+        self._thread.start()
+
+    def notify(self):
+        self._wake.set()
+
+    def _run(self):
+        delay = self.interval
+        while not self._stopped.is_set():
+            self._wake.wait(delay)
+            self._wake.clear()
+            try:
+                flush_spool(self.spool, self.db)
+                self.failures = 0
+                delay = self.interval
+            except Exception as e:
+                self.failures += 1
+                delay = min(self.max_backoff, self.interval * 2 ** self.failures)
+                print(f"Error flushing request spool (retrying in {delay:.1f}s): {e}")
+
+    def stop(self, drain_timeout=5):
+        """
+        Stop the flusher after one last drain attempt of up to drain_timeout seconds.
+        """
+        self._wake.set()
+        deadline = time.monotonic() + drain_timeout
+        while self.spool.pending(limit=1) and time.monotonic() < deadline and self.failures == 0:
+            time.sleep(0.05)
+        self._stopped.set()
+        self._wake.set()
+        self._thread.join(timeout=drain_timeout)
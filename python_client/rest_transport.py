@@ -0,0 +1,423 @@
+import base64
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from deadlines import DeadlineExceeded
+from request_spool import new_request_id
+
+FIRESTORE_URL = 'https://firestore.googleapis.com/v1'
+SCOPES = ['https://www.googleapis.com/auth/datastore']
+
+# Refresh access tokens this many seconds before they expire
+TOKEN_MARGIN = 300
+
+# Statuses worth retrying; everything else is returned to the caller
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+OPERATORS = {
+    '==': 'EQUAL',
+    '!=': 'NOT_EQUAL',
+    '<': 'LESS_THAN',
+    '<=': 'LESS_THAN_OR_EQUAL',
+    '>': 'GREATER_THAN',
+    '>=': 'GREATER_THAN_OR_EQUAL',
+    'in': 'IN',
+    'not-in': 'NOT_IN',
+    'array_contains': 'ARRAY_CONTAINS',
+    'array_contains_any': 'ARRAY_CONTAINS_ANY',
+}
+
+
+class FirestoreRestError(Exception):
+    """Raised when the Firestore REST API answers with an error."""
+
+    def __init__(self, status_code, message):
+        super().__init__(f"HTTP {status_code}: {message}")
+        self.status_code = status_code
+
+
+def _format_timestamp(value):
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.astimezone(datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+
+
+def _parse_timestamp(text):
+    # Firestore sends UTC with up to nanosecond precision; keep microseconds
+    seconds, _, fraction = text.rstrip('Z').partition('.')
+    parsed = datetime.datetime.strptime(seconds, '%Y-%m-%dT%H:%M:%S')
+    microseconds = int((fraction + '000000')[:6]) if fraction else 0
+    return parsed.replace(microsecond=microseconds, tzinfo=datetime.timezone.utc)
+
+
+def encode_value(value):
+    """
+    Convert a Python value to a Firestore REST Value.
+    """
+    if value is None:
+        return {'nullValue': None}
+    if isinstance(value, bool):
+        return {'booleanValue': value}
+    if isinstance(value, int):
+        return {'integerValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    if isinstance(value, str):
+        return {'stringValue': value}
+    if isinstance(value, bytes):
+        return {'bytesValue': base64.b64encode(value).decode('ascii')}
+    if isinstance(value, datetime.datetime):
+        return {'timestampValue': _format_timestamp(value)}
+    if isinstance(value, (list, tuple)):
+        return {'arrayValue': {'values': [encode_value(item) for item in value]}}
+    if isinstance(value, dict):
+        return {'mapValue': {'fields': encode_fields(value)}}
+    raise TypeError(f"Cannot store {type(value).__name__} values in Firestore")
+
+
+def decode_value(value):
+    """
+    Convert a Firestore REST Value to a Python value.
+    """
+    kind, content = next(iter(value.items()))
+    if kind == 'integerValue':
+        return int(content)
+    if kind == 'doubleValue':
+        return float(content)
+    if kind == 'timestampValue':
+        return _parse_timestamp(content)
+    if kind == 'bytesValue':
+        return base64.b64decode(content)
+    if kind == 'arrayValue':
+        return [decode_value(item) for item in content.get('values', [])]
+    if kind == 'mapValue':
+        return decode_fields(content.get('fields', {}))
+    # nullValue, booleanValue, stringValue, referenceValue, geoPointValue
+    return content
+
+
+def encode_fields(data):
+    return {key: encode_value(value) for key, value in data.items()}
+
+
+def decode_fields(fields):
+    return {key: decode_value(value) for key, value in fields.items()}
+
+
+def _structured_query(collection, filters):
+    query = {'from': [{'collectionId': collection}]}
+    conditions = [{'fieldFilter': {'field': {'fieldPath': field}, 'op': OPERATORS[op],
+                                   'value': encode_value(value)}}
+                  for field, op, value in filters]
+    if len(conditions) == 1:
+        query['where'] = conditions[0]
+    elif conditions:
+        query['where'] = {'compositeFilter': {'op': 'AND', 'filters': conditions}}
+    return query
+
+
+def _default_token_cache_path(client_email):
+    cache_dir = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    digest = hashlib.sha256(client_email.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(cache_dir, 'approver', f"token-{digest}.json")
+
+
+class AccessTokenCache:
+    def __init__(self, credentials_path, cache_path=None):
+        """
+        OAuth access token for a service account, cached in memory and on disk.
+
+        Short-lived processes reuse the token left by the previous run instead
+        of signing and exchanging a new JWT every time. google-auth is only
+        imported when a new token is actually needed.
+
+        Args:
+            credentials_path: Path to the service account JSON file
+            cache_path: File to keep the token in (readable by the owner only).
+                        Defaults to a per-account file under ~/.cache/approver.
+                        Pass False to keep the token in memory only.
+        """
+        with open(credentials_path) as f:
+            self.info = json.load(f)
+        if cache_path is None:
+            cache_path = _default_token_cache_path(self.info['client_email'])
+        self.cache_path = cache_path or None
+        self._lock = threading.Lock()
+        self._token = None
+        self._expires_at = 0
+
+    def _load_cached(self):
+        try:
+            with open(self.cache_path) as f:
+                cached = json.load(f)
+            self._token, self._expires_at = cached['token'], cached['expiresAt']
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _save_cached(self):
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        temp_path = self.cache_path + '.tmp'
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'token': self._token, 'expiresAt': self._expires_at}, f)
+        os.replace(temp_path, self.cache_path)
+
+    def _refresh(self, session):
+        from google.oauth2 import service_account
+        from google.auth.transport.requests import Request
+        credentials = service_account.Credentials.from_service_account_info(self.info, scopes=SCOPES)
+        credentials.refresh(Request(session))
+        self._token = credentials.token
+        # google-auth reports expiry as a naive UTC datetime
+        self._expires_at = credentials.expiry.replace(tzinfo=datetime.timezone.utc).timestamp()
+        if self.cache_path:
+            self._save_cached()
+
+    def token(self, session):
+        """
+        Return a token valid for at least TOKEN_MARGIN seconds.
+        """
+        with self._lock:
+            if self._expires_at - TOKEN_MARGIN > time.time():
+                return self._token
+            if self.cache_path:
+                self._load_cached()
+                if self._expires_at - TOKEN_MARGIN > time.time():
+                    return self._token
+            self._refresh(session)
+            return self._token
+
+    def invalidate(self):
+        """
+        Forget the current token, e.g. after the server rejected it.
+        """
+        with self._lock:
+            self._token, self._expires_at = None, 0
+            if self.cache_path and os.path.exists(self.cache_path):
+                os.remove(self.cache_path)
+
+
+class FirestoreRestClient:
+    def __init__(self, project_id, database=None, token_source=None, base_url=FIRESTORE_URL,
+                 pool_size=10, max_retries=3):
+        """
+        Minimal Firestore client over the REST API: create, get, batch get and
+        simple queries.
+
+        It imports no gRPC or protobuf code and opens no channel, so a one-shot
+        process reaches its first request much sooner than with
+        google-cloud-firestore. Connections are pooled in one HTTP session and
+        reused across calls.
+
+        Args:
+            project_id: Google Cloud project ID
+            database: Named Firestore database. Defaults to "(default)".
+            token_source: AccessTokenCache, or None to send the emulator's
+                          "Bearer owner" token
+            base_url: API root, e.g. http://localhost:8080/v1 for the emulator
+            pool_size: Maximum pooled connections
+            max_retries: Retries for unavailable / rate-limited responses
+        """
+        self.project_id = project_id
+        self.database = database or '(default)'
+        self.token_source = token_source
+        self.base_url = base_url.rstrip('/')
+        self.max_retries = max_retries
+        self.database_path = f"projects/{project_id}/databases/{self.database}"
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    @classmethod
+    def from_service_account(cls, credentials_path, database=None, token_cache_path=None, **kwargs):
+        """
+        Create a client for the project of a service account. When
+        FIRESTORE_EMULATOR_HOST is set, talk to the emulator instead.
+        """
+        emulator_host = os.environ.get('FIRESTORE_EMULATOR_HOST')
+        if emulator_host:
+            with open(credentials_path) as f:
+                project_id = json.load(f)['project_id']
+            return cls(project_id, database, base_url=f"http://{emulator_host}/v1", **kwargs)
+        token_source = AccessTokenCache(credentials_path, token_cache_path)
+        return cls(token_source.info['project_id'], database, token_source=token_source, **kwargs)
+
+    def document_name(self, collection, document_id):
+        return f"{self.database_path}/documents/{collection}/{document_id}"
+
+    def _headers(self):
+        if self.token_source is None:
+            return {'Authorization': 'Bearer owner'}
+        return {'Authorization': f"Bearer {self.token_source.token(self.session)}"}
+
+    def _request(self, method, path, body=None, timeout=None):
+        return self._request_attempts(method, path, body, timeout)[0]
+
+    def _request_attempts(self, method, path, body=None, timeout=None):
+        # Returns (response, number of times the request was sent)
+        expires_at = None if timeout is None else time.monotonic() + timeout
+        url = f"{self.base_url}/{path}"
+        attempt, reauthorized = 0, False
+        while True:
+            remaining = None if expires_at is None else expires_at - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise DeadlineExceeded(f"{method} {path} timed out")
+            try:
+                response = self.session.request(method, url, json=body, headers=self._headers(),
+                                                timeout=remaining)
+            except requests.Timeout as e:
+                raise DeadlineExceeded(str(e)) from e
+            except requests.ConnectionError:
+                if attempt >= self.max_retries:
+                    raise
+                response = None
+            if response is not None:
+                if response.status_code == 401 and self.token_source is not None and not reauthorized:
+                    self.token_source.invalidate()
+                    reauthorized = True
+                    continue
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return response, attempt + 1
+            attempt += 1
+            delay = min(2.0, 0.1 * 2 ** attempt)
+            if remaining is not None:
+                delay = min(delay, max(0.0, expires_at - time.monotonic()))
+            time.sleep(delay)
+
+    def _check(self, response):
+        if response.status_code >= 400:
+            try:
+                message = response.json()['error']['message']
+            except (ValueError, KeyError, TypeError):
+                message = response.text
+            raise FirestoreRestError(response.status_code, message)
+        return response.json()
+
+    def create_document(self, collection, fields, document_id=None, server_timestamps=(),
+                        timeout=None):
+        """
+        Create a document, failing with FirestoreRestError (409) if it already
+        exists.
+
+        Args:
+            collection: Collection ID
+            fields: Document data
+            document_id: Document ID. Defaults to a new random ID.
+            server_timestamps: Field names to set to the commit time
+            timeout: Time limit in seconds
+
+        Returns:
+            ID of the created document
+        """
+        generated = document_id is None
+        document_id = document_id or new_request_id()
+        write = {
+            'update': {'name': self.document_name(collection, document_id),
+                       'fields': encode_fields(fields)},
+            'currentDocument': {'exists': False},
+        }
+        if server_timestamps:
+            write['updateTransforms'] = [{'fieldPath': field, 'setToServerValue': 'REQUEST_TIME'}
+                                         for field in server_timestamps]
+        response, attempts = self._request_attempts(
+            'POST', f"{self.database_path}/documents:commit", {'writes': [write]}, timeout)
+        # With a fresh random ID and a retried commit, "already exists" means an
+        # earlier attempt of this same write landed before its response was lost
+        if not (response.status_code == 409 and generated and attempts > 1):
+            self._check(response)
+        return document_id
+
+    def get_document(self, collection, document_id, timeout=None):
+        """
+        Returns:
+            The document's data, or None if it does not exist
+        """
+        response = self._request('GET', self.document_name(collection, document_id), timeout=timeout)
+        if response.status_code == 404:
+            return None
+        return decode_fields(self._check(response).get('fields', {}))
+
+    def batch_get(self, collection, document_ids, timeout=None):
+        """
+        Read several documents in one round trip.
+
+        Returns:
+            Dict of document ID to data (None for missing documents), in the
+            order requested
+        """
+        document_ids = list(document_ids)
+        if not document_ids:
+            return {}
+        names = [self.document_name(collection, document_id) for document_id in document_ids]
+        response = self._request('POST', f"{self.database_path}/documents:batchGet",
+                                 {'documents': names}, timeout)
+        found = {}
+        for result in self._check(response):
+            if 'found' in result:
+                document = result['found']
+                found[document['name'].rsplit('/', 1)[1]] = decode_fields(document.get('fields', {}))
+        return {document_id: found.get(document_id) for document_id in document_ids}
+
+    def run_query(self, collection, filters=(), order_by=None, direction='ASCENDING', limit=None,
+                  timeout=None):
+        """
+        Run a query on one collection.
+
+        Args:
+            collection: Collection ID
+            filters: (field, operator, value) tuples, combined with AND.
+                     Operators as in google-cloud-firestore, e.g. '==' or 'in'.
+            order_by: Field to order by
+            direction: 'ASCENDING' or 'DESCENDING'
+            limit: Maximum number of documents
+
+        Returns:
+            List of (document ID, data) tuples
+        """
+        query = _structured_query(collection, filters)
+        if order_by:
+            query['orderBy'] = [{'field': {'fieldPath': order_by}, 'direction': direction}]
+        if limit is not None:
+            query['limit'] = limit
+        response = self._request('POST', f"{self.database_path}/documents:runQuery",
+                                 {'structuredQuery': query}, timeout)
+        results = []
+        for result in self._check(response):
+            document = result.get('document')
+            if document is not None:
+                results.append((document['name'].rsplit('/', 1)[1],
+                                decode_fields(document.get('fields', {}))))
+        return results
+
+    def count(self, collection, filters=(), timeout=None):
+        """
+        Count the documents matching a query with an aggregation query.
+
+        Args:
+            collection: Collection ID
+            filters: (field, operator, value) tuples, combined with AND
+            timeout: Time limit in seconds
+
+        Returns:
+            Number of matching documents
+        """
+        body = {'structuredAggregationQuery': {
+            'structuredQuery': _structured_query(collection, filters),
+            'aggregations': [{'alias': 'count', 'count': {}}],
+        }}
+        response = self._request('POST', f"{self.database_path}/documents:runAggregationQuery",
+                                 body, timeout)
+        for result in self._check(response):
+            fields = result.get('result', {}).get('aggregateFields', {})
+            if 'count' in fields:
+                return decode_value(fields['count'])
+        return 0
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+import argparse
+import datetime
+import json
+import operator
+import re
+import time
+from profiling import add_profile_arguments, start_profiling
+from approval_client import ApprovalClient, lease_active
+
+# Friendly rule field names mapped to Firestore document fields
+FIELD_ALIASES = {
+    'requester': 'requesterId',
+    'requester_id': 'requesterId',
+    'email': 'requesterEmail',
+    'requester_email': 'requesterEmail',
+    'created_at': 'createdAt',
+}
+
+_MISSING = object()
+
+# google.rpc.Code.FAILED_PRECONDITION: the request changed after it was read
+FAILED_PRECONDITION = 9
+# Attempts per write for other (transient) errors before giving up on it
+MAX_WRITE_ATTEMPTS = 10
+
+
+def _compare(fn):
+    def build(value):
+        return lambda actual: actual is not _MISSING and actual is not None and fn(actual, value)
+    return build
+
+
+def _in(value):
+    values = frozenset(value)
+
+    def test(actual):
+        try:
+            return actual in values
+        except TypeError:  # Unhashable, e.g. a list field
+            return False
+    return test
+
+
+def _not_in(value):
+    values = frozenset(value)
+
+    def test(actual):
+        try:
+            return actual not in values
+        except TypeError:  # Unhashable, e.g. a list field
+            return False
+    return test
+
+
+def _contains(value):
+    value = value.lower()
+    return lambda actual: isinstance(actual, str) and value in actual.lower()
+
+
+def _startswith(value):
+    value = value.lower()
+    return lambda actual: isinstance(actual, str) and actual.lower().startswith(value)
+
+
+def _regex(value):
+    search = re.compile(value, re.IGNORECASE).search
+    return lambda actual: isinstance(actual, str) and search(actual) is not None
+
+
+def _exists(value):
+    return lambda actual: (actual is not _MISSING) == bool(value)
+
+
+OPERATORS = {
+    'eq': lambda value: lambda actual: actual == value,
+    'ne': lambda value: lambda actual: actual != value,
+    'lt': _compare(operator.lt),
+    'lte': _compare(operator.le),
+    'gt': _compare(operator.gt),
+    'gte': _compare(operator.ge),
+    'in': _in,
+    'not_in': _not_in,
+    'contains': _contains,
+    'startswith': _startswith,
+    'regex': _regex,
+    'exists': _exists,
+}
+
+
+def compile_condition(spec):
+    """
+    Compile a condition spec into a predicate over request dicts.
+
+    A condition is either a field test such as
+        {"field": "title", "op": "eq", "value": "Training request"}
+    or a combination: {"all": [...]}, {"any": [...]} or {"not": {...}}.
+    """
+    if 'all' in spec:
+        parts = tuple(compile_condition(part) for part in spec['all'])
+        return lambda data: all(part(data) for part in parts)
+    if 'any' in spec:
+        parts = tuple(compile_condition(part) for part in spec['any'])
+        return lambda data: any(part(data) for part in parts)
+    if 'not' in spec:
+        inner = compile_condition(spec['not'])
+        return lambda data: not inner(data)
+
+    field = FIELD_ALIASES.get(spec['field'], spec['field'])
+    op = spec.get('op', 'eq')
+    if op not in OPERATORS:
+        raise ValueError(f"Unknown operator {op} for field {spec['field']}")
+    test = OPERATORS[op](spec.get('value'))
+    return lambda data: test(data.get(field, _MISSING))
+
+
+class Rule:
+    def __init__(self, name, decision, predicate):
+        self.name = name
+        self.decision = decision
+        self.predicate = predicate
+        self.hits = 0
+        self.evaluations = 0
+        self.elapsed_ns = 0
+
+
+def compile_rules(spec):
+    """
+    Compile a rules document into a list of Rule objects.
+
+    The document is {"rules": [{"name": ..., "decision": "approved" | "rejected",
+    "when": <condition>}, ...]}. Rules are tried in order and the first match wins.
+    """
+    rules = []
+    for i, rule in enumerate(spec['rules']):
+        name = rule.get('name', f"rule-{i + 1}")
+        decision = rule['decision']
+        if decision not in ('approved', 'rejected'):
+            raise ValueError(f"Rule {name} has invalid decision {decision}")
+        rules.append(Rule(name, decision, compile_condition(rule['when'])))
+    return rules
+
+
+class RuleEngine:
+    def __init__(self, rules):
+        """
+        Evaluate compiled rules over batches of requests.
+
+        Args:
+            rules: List of Rule objects from compile_rules
+        """
+        self.rules = rules
+        self.evaluated = 0
+        self.undecided = 0
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as f:
+            return cls(compile_rules(json.load(f)))
+
+    def evaluate_batch(self, items):
+        """
+        Decide a batch of requests.
+
+        Args:
+            items: List of (request_id, request_data) tuples
+
+        Returns:
+            List of (request_id, decision, rule_name) for requests a rule matched
+        """
+        decisions = []
+        pending = items
+        perf_counter_ns = time.perf_counter_ns
+        # Apply rules one at a time over the whole batch so the timing and the
+        # tight loop stay per rule; requests matched by a rule drop out early.
+        for rule in self.rules:
+            if not pending:
+                break
+            predicate = rule.predicate
+            remaining = []
+            start = perf_counter_ns()
+            for item in pending:
+                if predicate(item[1]):
+                    decisions.append((item[0], rule.decision, rule.name))
+                else:
+                    remaining.append(item)
+            rule.elapsed_ns += perf_counter_ns() - start
+            rule.evaluations += len(pending)
+            rule.hits += len(pending) - len(remaining)
+            pending = remaining
+        self.evaluated += len(items)
+        self.undecided += len(pending)
+        return decisions
+
+    def report(self):
+        """
+        Per-rule hit counts and timings.
+        """
+        return {
+            'evaluated': self.evaluated,
+            'undecided': self.undecided,
+            'rules': [
+                {
+                    'name': rule.name,
+                    'decision': rule.decision,
+                    'hits': rule.hits,
+                    'evaluations': rule.evaluations,
+                    'elapsed_ms': rule.elapsed_ns / 1e6,
+                }
+                for rule in self.rules
+            ],
+        }
+
+
+def apply_rules(client, engine, dry_run=True, batch_size=1000, limit=None):
+    """
+    Stream pending requests, decide them in batches and write the decisions in bulk.
+
+    Requests currently leased by a worker are skipped, since the worker is
+    deciding them. Decisions are written with a last-update-time precondition,
+    so a request that was changed (e.g. decided in the app, or leased) after it
+    was read is left alone.
+
+    Args:
+        client: The ApprovalClient instance
+        engine: The RuleEngine to evaluate
+        dry_run: Only report what would be decided
+        batch_size: Requests evaluated per batch
+        limit: Maximum number of pending requests to read
+
+    Returns:
+        Dict with counts, timings and the per-rule report
+    """
+    query = client.db.collection('approvals').where('status', '==', 'pending')
+    if limit:
+        query = query.limit(limit)
+
+    writer = None if dry_run else client.db.bulk_writer()
+    failed = []
+
+    def on_write_error(error, _writer):
+        # Precondition failures mean the request changed after it was read; don't
+        # retry those. Retry transient errors (e.g. UNAVAILABLE) up to a limit.
+        if error.code != FAILED_PRECONDITION and error.attempts < MAX_WRITE_ATTEMPTS:
+            return True
+        failed.append(error)
+        return False
+
+    if writer is not None:
+        writer.on_write_error(on_write_error)
+
+    start = time.perf_counter()
+    now = datetime.datetime.now(datetime.timezone.utc)
+    read = written = leased = 0
+    batch, refs = [], {}
+
+    def flush():
+        nonlocal written
+        for request_id, decision, _rule in engine.evaluate_batch(batch):
+            if writer is not None:
+                ref, update_time = refs[request_id]
+                writer.update(ref, {'status': decision},
+                              option=client.db.write_option(last_update_time=update_time))
+            written += 1
+        batch.clear()
+        refs.clear()
+
+    for snapshot in query.stream():
+        data = snapshot.to_dict()
+        read += 1
+        if lease_active(data, now):
+            leased += 1
+            continue
+        batch.append((snapshot.id, data))
+        refs[snapshot.id] = (snapshot.reference, snapshot.update_time)
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+
+    if writer is not None:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    return {
+        'dry_run': dry_run,
+        'read': read,
+        'leased': leased,
+        'decided': written - len(failed),
+        'failed': len(failed),
+        'seconds': elapsed,
+        'report': engine.report(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Auto-decide pending approval requests with rules')
+    parser.add_argument('--credentials', default='./service-account-key.json',
+                        help='Path to Firebase credentials JSON file')
+    parser.add_argument('--rules', required=True,
+                        help='Path to rules JSON file')
+    parser.add_argument('--apply', action='store_true',
+                        help='Write decisions (default is a dry run)')
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help='Requests evaluated per batch')
+    parser.add_argument('--limit', type=int,
+                        help='Maximum number of pending requests to process')
+
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    start_profiling(args)
+
+    try:
+        engine = RuleEngine.from_file(args.rules)
+        client = ApprovalClient(args.credentials)
+
+        result = apply_rules(client, engine, dry_run=not args.apply,
+                             batch_size=args.batch_size, limit=args.limit)
+
+        mode = "DRY RUN" if result['dry_run'] else "APPLIED"
+        print(f"[{mode}] Read {result['read']} pending requests in {result['seconds']:.2f}s "
+              f"({result['leased']} skipped as leased by a worker)")
+        for rule in result['report']['rules']:
+            print(f"  {rule['name']:<30} {rule['decision']:<9} hits={rule['hits']:<7} "
+                  f"evaluated={rule['evaluations']:<7} {rule['elapsed_ms']:.2f}ms")
+        print(f"Decided: {result['decided']}  Undecided: {result['report']['undecided']}  "
+              f"Failed writes: {result['failed']}")
+
+    except Exception as e:
+        print(f"Error: {e}")
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+import argparse
+import re
+import time
+from profiling import add_profile_arguments, start_profiling
+from sync_approvals import ApprovalMirror, from_micros, parse_date, to_micros
+
+# The index is an FTS5 table stored in the mirror database file. Triggers keep it
+# in step with every row the sync process writes, so it is built incrementally and
+# survives restarts. The prefix option adds dedicated indexes for 2- and 3-letter
+# prefixes so short prefix queries don't scan the whole term list.
+INDEX_SCHEMA = """
+CREATE VIRTUAL TABLE approvals_fts USING fts5(
+    title, description,
+    content='approvals', content_rowid='rowid',
+    tokenize='unicode61 remove_diacritics 2',
+    prefix='2 3'
+);
+CREATE TRIGGER approvals_fts_insert AFTER INSERT ON approvals BEGIN
+    INSERT INTO approvals_fts (rowid, title, description)
+    VALUES (new.rowid, new.title, new.description);
+END;
+CREATE TRIGGER approvals_fts_delete AFTER DELETE ON approvals BEGIN
+    INSERT INTO approvals_fts (approvals_fts, rowid, title, description)
+    VALUES ('delete', old.rowid, old.title, old.description);
+END;
+CREATE TRIGGER approvals_fts_update AFTER UPDATE OF title, description ON approvals BEGIN
+    INSERT INTO approvals_fts (approvals_fts, rowid, title, description)
+    VALUES ('delete', old.rowid, old.title, old.description);
+    INSERT INTO approvals_fts (rowid, title, description)
+    VALUES (new.rowid, new.title, new.description);
+END;
+INSERT INTO approvals_fts (approvals_fts) VALUES ('rebuild');
+"""
+
+# BM25 column weights: a match in the title counts more than one in the description
+TITLE_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+# Index pages are read through a memory map instead of read() calls
+MMAP_SIZE = 256 * 1024 * 1024
+
+_TOKEN = re.compile(r"[\w]+\*?", re.UNICODE)
+
+
+def build_match_query(text, prefix=False):
+    """
+    Turn free text into an FTS5 MATCH expression.
+
+    Every word must match. A trailing '*' makes a word a prefix query; with
+    prefix=True every word is treated as a prefix.
+
+    Args:
+        text: Search text, e.g. "laptop purch*"
+        prefix: Treat all words as prefixes
+
+    Returns:
+        MATCH expression, or None if the text has no searchable words
+    """
+    terms = []
+    for token in _TOKEN.findall(text):
+        is_prefix = prefix or token.endswith('*')
+        word = token.rstrip('*')
+        if word:
+            terms.append(f'"{word}"*' if is_prefix else f'"{word}"')
+    return ' AND '.join(terms) or None
+
+
+class ApprovalSearchIndex:
+    def __init__(self, mirror):
+        """
+        Full-text search over the titles and descriptions in an ApprovalMirror.
+
+        The first time this is opened on a mirror the index is built from the
+        existing rows; from then on it is maintained as the mirror syncs.
+
+        Args:
+            mirror: The ApprovalMirror to index
+        """
+        self.mirror = mirror
+        with mirror._lock, mirror.conn:
+            mirror.conn.execute(f'PRAGMA mmap_size={MMAP_SIZE}')
+            exists = mirror.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'approvals_fts'"
+            ).fetchone()
+            if not exists:
+                mirror.conn.executescript(INDEX_SCHEMA)
+
+    def search(self, text, status=None, requester=None, since=None, until=None,
+               limit=20, prefix=False):
+        """
+        Search requests ranked by BM25.
+
+        Args:
+            text: Search text; append '*' to a word for a prefix match
+            status: Only return requests with this status
+            requester: Requester ID, or the start of the requester email
+            since: Only return requests created at or after this datetime
+            until: Only return requests created before this datetime
+            limit: Maximum number of results
+            prefix: Treat every word as a prefix
+
+        Returns:
+            List of dicts with the request fields and a 'score' (higher is better)
+        """
+        match = build_match_query(text, prefix=prefix)
+        if match is None:
+            return []
+        clauses = ['approvals_fts MATCH ?']
+        params = [TITLE_WEIGHT, DESCRIPTION_WEIGHT, match]
+        if status:
+            clauses.append('a.status = ?')
+            params.append(status)
+        if requester:
+            clauses.append('(a.requester_id = ? OR a.requester_email LIKE ?)')
+            params.extend([requester, requester.replace('%', '') + '%'])
+        if since is not None:
+            clauses.append('a.created_at >= ?')
+            params.append(to_micros(since))
+        if until is not None:
+            clauses.append('a.created_at < ?')
+            params.append(to_micros(until))
+        params.append(limit)
+        sql = (
+            'SELECT a.*, -bm25(approvals_fts, ?, ?) AS score '
+            'FROM approvals_fts JOIN approvals a ON a.rowid = approvals_fts.rowid '
+            f"WHERE {' AND '.join(clauses)} "
+            'ORDER BY score DESC LIMIT ?'
+        )
+        with self.mirror._lock:
+            return [dict(row) for row in self.mirror.conn.execute(sql, params)]
+
+    def optimize(self):
+        """
+        Merge the index segments into one for the most compact on-disk layout.
+        """
+        with self.mirror._lock, self.mirror.conn:
+            self.mirror.conn.execute(
+                "INSERT INTO approvals_fts (approvals_fts) VALUES ('optimize')"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Full-text search over the local approvals mirror')
+    parser.add_argument('--db', default='approvals.db',
+                        help='Path to the local SQLite mirror (see sync_approvals.py)')
+    parser.add_argument('query', nargs='?', default='',
+                        help='Search text, e.g. "laptop purch*"')
+    parser.add_argument('--status', help='Filter by status')
+    parser.add_argument('--requester', help='Filter by requester ID or email prefix')
+    parser.add_argument('--since', type=parse_date, help='Created on or after (ISO date)')
+    parser.add_argument('--until', type=parse_date, help='Created before (ISO date)')
+    parser.add_argument('--limit', type=int, default=20, help='Maximum results to show')
+    parser.add_argument('--prefix', action='store_true', help='Treat every word as a prefix')
+    parser.add_argument('--optimize', action='store_true',
+                        help='Compact the index after building it')
+
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    start_profiling(args)
+
+    mirror = ApprovalMirror(args.db)
+    try:
+        index = ApprovalSearchIndex(mirror)
+        if args.optimize:
+            index.optimize()
+            print("Search index optimized")
+        if args.query:
+            start = time.perf_counter()
+            results = index.search(args.query, args.status, args.requester, args.since,
+                                   args.until, args.limit, args.prefix)
+            elapsed = (time.perf_counter() - start) * 1000
+            for row in results:
+                created = from_micros(row['created_at']).date().isoformat() if row['created_at'] else '-'
+                print(f"{row['score']:7.2f}  {row['id']}  {row['status']:<8}  {created}  "
+                      f"{row['requester_email']}  {row['title']}")
+            print(f"{len(results)} results in {elapsed:.2f}ms")
+
+    except Exception as e:
+        print(f"Error: {e}")
+        return 1
+    finally:
+        mirror.close()
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
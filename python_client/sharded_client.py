@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+import argparse
+import bisect
+import hashlib
+import json
+from concurrent.futures import ThreadPoolExecutor
+from profiling import add_profile_arguments, start_profiling
+from approval_client import ApprovalClient
+from deadlines import Deadline
+
+# Separates the shard name from the Firestore document ID in sharded request IDs.
+# Firestore auto-generated IDs are alphanumeric, so this never appears in them.
+SHARD_SEPARATOR = '~'
+
+STATUSES = ('pending', 'approved', 'rejected')
+
+
+def _hash(value):
+    return int.from_bytes(hashlib.md5(value.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    def __init__(self, shard_names, replicas=64):
+        """
+        Consistent hash ring mapping routing keys to shard names.
+
+        Each shard is placed on the ring `replicas` times, so adding or removing
+        a shard only moves roughly 1/n of the keys.
+
+        Args:
+            shard_names: Names of the shards on the ring
+            replicas: Virtual nodes per shard
+        """
+        self.replicas = replicas
+        self._ring = []
+        for name in shard_names:
+            self.add(name)
+
+    def add(self, shard_name):
+        for i in range(self.replicas):
+            bisect.insort(self._ring, (_hash(f"{shard_name}#{i}"), shard_name))
+
+    def remove(self, shard_name):
+        self._ring = [node for node in self._ring if node[1] != shard_name]
+
+    def get(self, key):
+        if not self._ring:
+            raise ValueError("Hash ring has no shards")
+        index = bisect.bisect(self._ring, (_hash(key), '')) % len(self._ring)
+        return self._ring[index][1]
+
+
+def split_request_id(request_id):
+    """
+    Split a sharded request ID into (shard_name, document_id).
+    """
+    shard_name, separator, document_id = request_id.partition(SHARD_SEPARATOR)
+    if not separator or not shard_name or not document_id:
+        raise ValueError(f"Request ID {request_id} does not include a shard")
+    return shard_name, document_id
+
+
+def load_shard_config(path):
+    """
+    Load a shard configuration file.
+
+    The file is a JSON list of objects with a unique "name", a "credentials"
+    path, an optional named Firestore "database" and an optional "transport"
+    ("grpc" or "rest"; REST shards support create, check and list only), e.g.
+
+        [{"name": "eu", "credentials": "eu-key.json"},
+         {"name": "us", "credentials": "us-key.json", "database": "approvals-us"}]
+    """
+    with open(path) as f:
+        shards = json.load(f)
+    names = [shard['name'] for shard in shards]
+    if len(set(names)) != len(names):
+        raise ValueError("Shard names must be unique")
+    for name in names:
+        if SHARD_SEPARATOR in name:
+            raise ValueError(f"Shard name {name} must not contain '{SHARD_SEPARATOR}'")
+    return shards
+
+
+class ShardedApprovalClient:
+    def __init__(self, shards, replicas=64, hedge=False, transport='grpc'):
+        """
+        Route approval requests across several Firebase projects or named databases.
+
+        New requests are placed with consistent hashing on the tenant key (or the
+        requester ID when no tenant is given). The shard name is encoded in the
+        returned request ID, so status checks and watches go straight to the
+        right shard regardless of later ring changes.
+
+        Args:
+            shards: List of shard configs as returned by load_shard_config
+            replicas: Virtual nodes per shard on the hash ring
+            hedge: Hedge slow status checks on every shard (see ApprovalClient)
+            transport: Transport for shards whose config does not name one
+        """
+        self.clients = {}
+        for shard in shards:
+            self.clients[shard['name']] = ApprovalClient(
+                shard.get('credentials'),
+                app_name=f"shard-{shard['name']}",
+                database=shard.get('database'),
+                hedge=hedge,
+                transport=shard.get('transport', transport)
+            )
+        self.ring = HashRing(self.clients, replicas=replicas)
+
+    def add_shard(self, name, client):
+        """
+        Add a shard. Only keys that now hash to the new shard move; existing
+        requests stay on the shard named in their ID.
+        """
+        if SHARD_SEPARATOR in name:
+            raise ValueError(f"Shard name {name} must not contain '{SHARD_SEPARATOR}'")
+        self.clients[name] = client
+        self.ring.add(name)
+
+    def shard_for(self, routing_key):
+        return self.ring.get(routing_key)
+
+    def _client_for(self, request_id):
+        shard_name, document_id = split_request_id(request_id)
+        if shard_name not in self.clients:
+            raise ValueError(f"Unknown shard {shard_name} in request ID {request_id}")
+        return self.clients[shard_name], document_id
+
+    def create_approval_request(self, title, description, requester_id, requester_email,
+                                tenant=None, deadline=None):
+        """
+        Create a new approval request on the shard owning the tenant / requester.
+
+        Args:
+            title: Title of the request
+            description: Detailed description of the request
+            requester_id: ID or identifier of the requester
+            requester_email: Email of the requester
+            tenant: Optional tenant key used for routing instead of requester_id
+            deadline: Optional Deadline (or seconds) for the whole call
+
+        Returns:
+            Sharded ID of the created request ("<shard>~<document id>")
+        """
+        shard_name = self.shard_for(tenant if tenant is not None else requester_id)
+        document_id = self.clients[shard_name].create_approval_request(
+            title, description, requester_id, requester_email, deadline=deadline
+        )
+        return f"{shard_name}{SHARD_SEPARATOR}{document_id}"
+
+    def check_request_status(self, request_id, deadline=None):
+        """
+        Check the status of a sharded approval request.
+
+        Args:
+            request_id: Sharded ID as returned by create_approval_request
+            deadline: Optional Deadline (or seconds) for the whole call
+
+        Returns:
+            Status of the request (pending, approved, rejected) or None if not found
+        """
+        client, document_id = self._client_for(request_id)
+        return client.check_request_status(document_id, deadline=deadline)
+
+    def _fan_out(self, fn):
+        # Run fn(shard_name, client) on every shard in parallel
+        with ThreadPoolExecutor(max_workers=len(self.clients)) as executor:
+            futures = {name: executor.submit(fn, name, client)
+                       for name, client in self.clients.items()}
+            return {name: future.result() for name, future in futures.items()}
+
+    def list_requests(self, status=None, limit=50, deadline=None):
+        """
+        List requests from all shards, newest first.
+
+        Args:
+            status: Only return requests with this status
+            limit: Maximum number of requests to return
+            deadline: Optional Deadline (or seconds) shared by all shards
+
+        Returns:
+            List of request dicts including the sharded 'id'
+        """
+        deadline = Deadline.coerce(deadline)
+
+        def fetch(shard_name, client):
+            results = client.list_requests(status=status, limit=limit, deadline=deadline)
+            for data in results:
+                data['id'] = f"{shard_name}{SHARD_SEPARATOR}{data['id']}"
+            return results
+
+        merged = [item for items in self._fan_out(fetch).values() for item in items]
+        merged.sort(key=lambda item: item['createdAt'], reverse=True)
+        return merged[:limit]
+
+    def stats(self, deadline=None):
+        """
+        Count requests per status across all shards using aggregation queries.
+
+        Args:
+            deadline: Optional Deadline (or seconds) shared by all shards
+
+        Returns:
+            Dict with per-shard counts and a 'total' entry
+        """
+        deadline = Deadline.coerce(deadline)
+
+        def count(shard_name, client):
+            return {status: client.count_requests(status, deadline=deadline)
+                    for status in STATUSES}
+
+        per_shard = self._fan_out(count)
+        total = {status: sum(counts[status] for counts in per_shard.values())
+                 for status in STATUSES}
+        return {'shards': per_shard, 'total': total}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sharded Firebase Approval Request Client')
+    parser.add_argument('--shards', required=True, help='Path to shard configuration JSON file')
+    parser.add_argument('--timeout', type=float, help='Time limit in seconds for each operation')
+
+    subparsers = parser.add_subparsers(dest='command', help='Command to run')
+
+    create_parser = subparsers.add_parser('create', help='Create a new approval request')
+    create_parser.add_argument('--title', required=True, help='Title of the request')
+    create_parser.add_argument('--description', required=True, help='Description of the request')
+    create_parser.add_argument('--requester-id', required=True, help='ID of the requester')
+    create_parser.add_argument('--requester-email', required=True, help='Email of the requester')
+    create_parser.add_argument('--tenant', help='Tenant key used for routing (defaults to requester ID)')
+
+    check_parser = subparsers.add_parser('check', help='Check the status of an approval request')
+    check_parser.add_argument('--request-id', required=True, help='Sharded ID of the request')
+
+    list_parser = subparsers.add_parser('list', help='List requests across all shards')
+    list_parser.add_argument('--status', help='Filter by status')
+    list_parser.add_argument('--limit', type=int, default=20, help='Maximum requests to show')
+
+    subparsers.add_parser('stats', help='Show request counts across all shards')
+
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    start_profiling(args)
+
+    try:
+        client = ShardedApprovalClient(load_shard_config(args.shards))
+
+        if args.command == 'create':
+            request_id = client.create_approval_request(
+                args.title,
+                args.description,
+                args.requester_id,
+                args.requester_email,
+                tenant=args.tenant,
+                deadline=args.timeout
+            )
+            print(f"Sharded request ID: {request_id}")
+        elif args.command == 'check':
+            client.check_request_status(args.request_id, deadline=args.timeout)
+        elif args.command == 'list':
+            for request in client.list_requests(args.status, args.limit, deadline=args.timeout):
+                print(f"{request['id']}  {request.get('status', 'unknown'):<8}  "
+                      f"{request.get('requesterEmail', '')}  {request.get('title', '')}")
+        elif args.command == 'stats':
+            stats = client.stats(deadline=args.timeout)
+            for shard_name, counts in stats['shards'].items():
+                print(f"{shard_name}: {counts}")
+            print(f"total: {stats['total']}")
+        else:
+            parser.print_help()
+
+    except Exception as e:
+        print(f"Error: {e}")
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
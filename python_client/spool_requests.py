@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+import argparse
+import time
+from profiling import add_profile_arguments, start_profiling
+from approval_client import ApprovalClient
+from request_spool import RequestSpool, flush_spool
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Inspect and drain the write-behind request spool')
+    parser.add_argument('--credentials', default='./service-account-key.json',
+                        help='Path to Firebase credentials JSON file')
+    parser.add_argument('--spool', default='requests.spool',
+                        help='Path to the spool file')
+
+    subparsers = parser.add_subparsers(dest='command', help='Command to run')
+
+    subparsers.add_parser('status', help='Show how many requests are waiting in the spool')
+
+    flush_parser = subparsers.add_parser('flush', help='Write spooled requests to Firestore')
+    flush_parser.add_argument('--batch-size', type=int, default=500,
+                              help='Requests per batch write (at most 500)')
+
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    start_profiling(args)
+
+    spool = RequestSpool(args.spool)
+    try:
+        if args.command == 'status':
+            status = spool.status()
+            print(f"Spool: {status['path']}")
+            print(f"Pending requests: {status['pending']}")
+            print(f"Oldest pending: {status['oldest'] or '-'}")
+            print(f"File size: {status['size']} bytes (flushed up to offset {status['offset']})")
+        elif args.command == 'flush':
+            client = ApprovalClient(args.credentials)
+            start = time.time()
+            written = flush_spool(spool, client.db, batch_size=args.batch_size)
+            print(f"Flushed {written} requests in {time.time() - start:.2f}s")
+        else:
+            parser.print_help()
+
+    except Exception as e:
+        print(f"Error: {e}")
+        return 1
+    finally:
+        spool.close()
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
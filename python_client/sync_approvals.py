@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+import argparse
+import datetime
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from profiling import add_profile_arguments, start_profiling
+from approval_client import ApprovalClient
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS approvals (
+    id TEXT PRIMARY KEY,
+    title TEXT,
+    description TEXT,
+    requester_id TEXT,
+    requester_email TEXT,
+    status TEXT,
+    created_at INTEGER,
+    update_time INTEGER,
+    decided_at INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_approvals_status_created ON approvals (status, created_at);
+CREATE INDEX IF NOT EXISTS idx_approvals_requester_created ON approvals (requester_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_approvals_created ON approvals (created_at);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value INTEGER
+);
+"""
+
+COLUMNS = ('id', 'title', 'description', 'requester_id', 'requester_email',
+           'status', 'created_at', 'update_time', 'decided_at')
+
+
+def to_micros(value):
+    """
+    Convert a Firestore timestamp (a datetime) to integer microseconds since the epoch.
+    Returns None for missing values.
+    """
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return int(value.timestamp() * 1_000_000)
+
+
+def from_micros(value):
+    """
+    Convert integer microseconds since the epoch back to an aware UTC datetime.
+    """
+    return datetime.datetime.fromtimestamp(value / 1_000_000, tz=datetime.timezone.utc)
+
+
+def snapshot_to_row(snapshot):
+    """
+    Flatten an approvals document snapshot into a mirror row tuple.
+    """
+    data = snapshot.to_dict() or {}
+    return (
+        snapshot.id,
+        data.get('title', ''),
+        data.get('description', ''),
+        data.get('requesterId', ''),
+        data.get('requesterEmail', ''),
+        data.get('status', 'pending'),
+        to_micros(data.get('createdAt')),
+        to_micros(getattr(snapshot, 'update_time', None)),
+        to_micros(data.get('decidedAt')),
+    )
+
+
+class ApprovalMirror:
+    def __init__(self, path='approvals.db'):
+        """
+        Open (or create) the local SQLite mirror of the approvals collection.
+
+        Args:
+            path: Path of the SQLite database file
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+        columns = {row[1] for row in self.conn.execute('PRAGMA table_info(approvals)')}
+        if 'decided_at' not in columns:
+            # Mirrors created before decidedAt was mirrored; `sync --full` fills it in
+            self.conn.execute('ALTER TABLE approvals ADD COLUMN decided_at INTEGER')
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def upsert_rows(self, rows):
+        """
+        Insert or update rows and advance the createdAt checkpoint.
+
+        Args:
+            rows: Iterable of tuples as produced by snapshot_to_row
+
+        Returns:
+            Number of rows written
+        """
+        rows = list(rows)
+        if not rows:
+            return 0
+        max_created = max((r[6] for r in rows if r[6] is not None), default=None)
+        with self._lock, self.conn:
+            # A true upsert (rather than INSERT OR REPLACE) keeps rowids stable and
+            # fires UPDATE triggers, which the search index relies on
+            self.conn.executemany(
+                f"INSERT INTO approvals ({', '.join(COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(COLUMNS))}) "
+                f"ON CONFLICT(id) DO UPDATE SET "
+                + ', '.join(f"{column} = excluded.{column}" for column in COLUMNS[1:]),
+                rows
+            )
+            self._advance('created_at', max_created)
+        return len(rows)
+
+    def delete_ids(self, request_ids):
+        request_ids = list(request_ids)
+        if not request_ids:
+            return 0
+        with self._lock, self.conn:
+            self.conn.executemany('DELETE FROM approvals WHERE id = ?',
+                                  [(i,) for i in request_ids])
+        return len(request_ids)
+
+    def _advance(self, key, value):
+        # Checkpoints only ever move forward; must be called with the lock held
+        if value is None:
+            return
+        self.conn.execute(
+            "INSERT INTO sync_state (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = MAX(value, excluded.value)",
+            (key, value)
+        )
+
+    def set_state(self, key, value):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, value)
+            )
+
+    def get_state(self, key):
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT value FROM sync_state WHERE key = ?', (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def pending_ids(self):
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT id FROM approvals WHERE status = 'pending'"
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def query(self, status=None, requester_id=None, since=None, until=None, limit=None):
+        """
+        Query the local mirror. No Firestore reads are made.
+
+        Args:
+            status: Only return requests with this status
+            requester_id: Only return requests from this requester
+            since: Only return requests created at or after this datetime
+            until: Only return requests created before this datetime
+            limit: Maximum number of rows to return
+
+        Returns:
+            List of dicts, newest first
+        """
+        clauses, params = [], []
+        if status:
+            clauses.append('status = ?')
+            params.append(status)
+        if requester_id:
+            clauses.append('requester_id = ?')
+            params.append(requester_id)
+        if since is not None:
+            clauses.append('created_at >= ?')
+            params.append(to_micros(since))
+        if until is not None:
+            clauses.append('created_at < ?')
+            params.append(to_micros(until))
+        sql = 'SELECT * FROM approvals'
+        if clauses:
+            sql += ' WHERE ' + ' AND '.join(clauses)
+        sql += ' ORDER BY created_at DESC'
+        if limit:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        with self._lock:
+            return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def status_counts(self):
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT status, COUNT(*) FROM approvals GROUP BY status'
+            ).fetchall()
+        return {row[0]: row[1] for row in rows}
+
+
+class ApprovalSync:
+    def __init__(self, client, mirror, workers=4, batch_size=500):
+        """
+        Keep an ApprovalMirror up to date with the approvals collection.
+
+        The first run backfills the whole collection using parallel partition
+        queries. Afterwards a listener on pending requests delivers new requests
+        and decisions as deltas; a request that leaves the pending set is
+        re-read once to record its decision. On restart only requests created
+        after the stored checkpoint, plus requests that were pending locally,
+        are read again.
+
+        Edits to requests that are already decided are not picked up: they
+        never enter the pending listener, and documents carry no update
+        timestamp that could be queried. Run backfill() again (`sync --full`)
+        to re-copy everything.
+
+        Args:
+            client: The ApprovalClient instance
+            mirror: The ApprovalMirror to write into
+            workers: Number of parallel backfill workers
+            batch_size: Rows per SQLite write batch
+        """
+        self.client = client
+        self.mirror = mirror
+        self.workers = workers
+        self.batch_size = batch_size
+        self.collection = client.db.collection('approvals')
+        self._watch = None
+
+    def backfill(self):
+        """
+        Copy the whole collection into the mirror using parallel partition queries.
+
+        Returns:
+            Number of documents copied
+        """
+        start = time.time()
+        if self.workers > 1:
+            partitions = list(
+                self.client.db.collection_group('approvals').get_partitions(self.workers)
+            )
+            queries = [partition.query() for partition in partitions]
+        else:
+            queries = [self.collection]
+
+        def copy(query):
+            batch, total = [], 0
+            for snapshot in query.stream():
+                batch.append(snapshot_to_row(snapshot))
+                if len(batch) >= self.batch_size:
+                    total += self.mirror.upsert_rows(batch)
+                    batch = []
+            return total + self.mirror.upsert_rows(batch)
+
+        with ThreadPoolExecutor(max_workers=max(1, len(queries))) as executor:
+            total = sum(executor.map(copy, queries))
+
+        self.mirror.set_state('backfilled', 1)
+        print(f"Backfilled {total} requests in {time.time() - start:.1f}s "
+              f"({len(queries)} partitions)")
+        return total
+
+    def catch_up(self):
+        """
+        Read only the requests created since the last checkpoint.
+
+        Returns:
+            Number of documents copied
+        """
+        checkpoint = self.mirror.get_state('created_at')
+        if checkpoint is None:
+            return 0
+        query = self.collection.where('createdAt', '>', from_micros(checkpoint))
+        rows = [snapshot_to_row(snapshot) for snapshot in query.stream()]
+        count = self.mirror.upsert_rows(rows)
+        print(f"Caught up on {count} requests created since last sync")
+        return count
+
+    def refresh(self, request_ids):
+        """
+        Re-read specific requests (e.g. ones that left the pending set) and apply them.
+        """
+        request_ids = list(request_ids)
+        if not request_ids:
+            return
+        refs = [self.collection.document(request_id) for request_id in request_ids]
+        rows, missing = [], []
+        for snapshot in self.client.db.get_all(refs):
+            if snapshot.exists:
+                rows.append(snapshot_to_row(snapshot))
+            else:
+                missing.append(snapshot.id)
+        self.mirror.upsert_rows(rows)
+        self.mirror.delete_ids(missing)
+
+    def _on_snapshot(self, docs, changes, read_time):
+        try:
+            current = {doc.id for doc in docs}
+            rows = [snapshot_to_row(change.document) for change in changes
+                    if change.type.name in ('ADDED', 'MODIFIED')]
+            self.mirror.upsert_rows(rows)
+            # Anything pending locally but no longer in the pending set was decided or deleted
+            self.refresh(self.mirror.pending_ids() - current)
+            self.mirror.set_state('last_sync', to_micros(read_time))
+        except Exception as e:
+            print(f"Error applying sync delta: {e}")
+
+    def start(self):
+        """
+        Backfill or catch up, then start listening for deltas in the background.
+        """
+        if self.mirror.get_state('backfilled'):
+            self.catch_up()
+        else:
+            self.backfill()
+        self._watch = self.collection.where('status', '==', 'pending').on_snapshot(
+            self._on_snapshot
+        )
+
+    def stop(self):
+        if self._watch is not None:
+            self._watch.unsubscribe()
+            self._watch = None
+
+
+def parse_date(value):
+    return datetime.datetime.fromisoformat(value).replace(tzinfo=datetime.timezone.utc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Keep a local SQLite mirror of approval requests')
+    parser.add_argument('--credentials', default='./service-account-key.json',
+                        help='Path to Firebase credentials JSON file')
+    parser.add_argument('--db', default='approvals.db',
+                        help='Path to the local SQLite mirror')
+
+    subparsers = parser.add_subparsers(dest='command', help='Command to run')
+
+    sync_parser = subparsers.add_parser('sync', help='Sync the mirror with Firestore')
+    sync_parser.add_argument('--workers', type=int, default=4,
+                             help='Number of parallel backfill workers')
+    sync_parser.add_argument('--once', action='store_true',
+                             help='Exit after the backfill / catch-up instead of following changes')
+    sync_parser.add_argument('--full', action='store_true',
+                             help='Re-copy the whole collection, picking up edits to decided requests')
+
+    query_parser = subparsers.add_parser('query', help='Query the local mirror')
+    query_parser.add_argument('--status', help='Filter by status')
+    query_parser.add_argument('--requester-id', help='Filter by requester ID')
+    query_parser.add_argument('--since', type=parse_date, help='Created on or after (ISO date)')
+    query_parser.add_argument('--until', type=parse_date, help='Created before (ISO date)')
+    query_parser.add_argument('--limit', type=int, default=20, help='Maximum rows to show')
+
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    start_profiling(args)
+
+    mirror = ApprovalMirror(args.db)
+    try:
+        if args.command == 'sync':
+            client = ApprovalClient(args.credentials)
+            sync = ApprovalSync(client, mirror, workers=args.workers)
+            if args.full:
+                mirror.set_state('backfilled', 0)
+            if args.once:
+                if mirror.get_state('backfilled'):
+                    sync.catch_up()
+                    sync.refresh(mirror.pending_ids())
+                else:
+                    sync.backfill()
+            else:
+                sync.start()
+                print("Following changes. Press Ctrl+C to stop.")
+                try:
+                    while True:
+                        time.sleep(1)
+                except KeyboardInterrupt:
+                    sync.stop()
+            print(f"Mirror status counts: {mirror.status_counts()}")
+        elif args.command == 'query':
+            start = time.perf_counter()
+            rows = mirror.query(args.status, args.requester_id, args.since, args.until, args.limit)
+            elapsed = (time.perf_counter() - start) * 1000
+            for row in rows:
+                created = from_micros(row['created_at']).isoformat() if row['created_at'] else '-'
+                print(f"{row['id']}  {row['status']:<8}  {created}  "
+                      f"{row['requester_email']}  {row['title']}")
+            print(f"{len(rows)} rows in {elapsed:.2f}ms")
+        else:
+            parser.print_help()
+
+    except Exception as e:
+        print(f"Error: {e}")
+        return 1
+    finally:
+        mirror.close()
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
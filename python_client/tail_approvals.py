@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+import argparse
+import contextlib
+import sys
+import time
+from profiling import add_profile_arguments, start_profiling
+from approval_client import ApprovalClient
+from change_feed import ChangeFeed, parse_sink
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream added/decided events for approval requests')
+    parser.add_argument('--credentials', default='./service-account-key.json',
+                        help='Path to Firebase credentials JSON file')
+    parser.add_argument('--checkpoint', default='change-feed.json',
+                        help='File the feed position is saved in, so restarts resume')
+    parser.add_argument('--sink', action='append', dest='sinks',
+                        help='Where to send events: stdout, webhook=URL or unix=PATH '
+                             '(repeat for several; default: stdout)')
+    parser.add_argument('--include-existing', action='store_true',
+                        help='On the first run, also emit requests that are already pending')
+    parser.add_argument('--buffer-size', type=int, default=10000,
+                        help='Maximum events buffered per sink')
+    parser.add_argument('--batch-size', type=int, default=500,
+                        help='Maximum events per sink delivery')
+
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    start_profiling(args)
+
+    try:
+        sinks = [parse_sink(spec) for spec in (args.sinks or ['stdout'])]
+        # Status messages go to stderr so stdout stays pure JSON Lines
+        print(f"Initializing client with credentials from: {args.credentials}", file=sys.stderr)
+        with contextlib.redirect_stdout(sys.stderr):
+            client = ApprovalClient(args.credentials)
+
+        feed = ChangeFeed(client, sinks, checkpoint_path=args.checkpoint,
+                          include_existing=args.include_existing,
+                          buffer_size=args.buffer_size, batch_size=args.batch_size)
+        feed.start()
+        print("Tailing approvals. Press Ctrl+C to stop.", file=sys.stderr)
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            feed.stop()
+            print(f"\nEmitted {feed.emitted} events", file=sys.stderr)
+
+    except Exception as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    exit(main())
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import os
+from profiling import add_profile_arguments, profile_phase, start_profiling
 import requests
 import json
 import argparse
@@ -7,7 +8,8 @@ import time
 
 def send_approval_notification(service_account_path, device_token=None, topic=None, request_id="test-123"):
     # Get the access token
-    access_token = get_access_token(service_account_path)
+    with profile_phase('credentials'):
+        access_token = get_access_token(service_account_path)
     
     if not access_token:
         print("Failed to get access token")
@@ -77,7 +79,8 @@ def send_approval_notification(service_account_path, device_token=None, topic=No
     
     # Send the request
     try:
-        response = requests.post(fcm_url, headers=headers, data=json.dumps(payload))
+        with profile_phase('rpc'):
+            response = requests.post(fcm_url, headers=headers, data=json.dumps(payload))
         
         if response.status_code == 200:
             print("Approval notification sent successfully!")
@@ -164,6 +167,8 @@ if __name__ == "__main__":
     parser.add_argument('--request-id', '-r', default="test-" + str(int(time.time())),
                        help='Custom request ID for the approval')
     
+    add_profile_arguments(parser)
     args = parser.parse_args()
+    start_profiling(args)
     
     send_approval_notification(args.service_account, args.token, args.topic, args.request_id) 
\ No newline at end of file
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 import os
+from profiling import add_profile_arguments, profile_phase, start_profiling
 import requests
 import json
 import argparse
@@ -11,7 +12,8 @@ Make sure you have a service account key file from Firebase to use this script.
 
 def send_test_notification(service_account_path, device_token=None, topic=None):
     # Get the access token
-    access_token = get_access_token(service_account_path)
+    with profile_phase('credentials'):
+        access_token = get_access_token(service_account_path)
     
     if not access_token:
         print("Failed to get access token")
@@ -76,7 +78,8 @@ def send_test_notification(service_account_path, device_token=None, topic=None):
     
     # Send the request
     try:
-        response = requests.post(fcm_url, headers=headers, data=json.dumps(payload))
+        with profile_phase('rpc'):
+            response = requests.post(fcm_url, headers=headers, data=json.dumps(payload))
         
         if response.status_code == 200:
             print("Notification sent successfully!")
@@ -160,6 +163,8 @@ if __name__ == "__main__":
     group.add_argument('--token', '-t', help='Device token to send the notification to')
     group.add_argument('--topic', '-o', help='Topic to send the notification to')
     
+    add_profile_arguments(parser)
     args = parser.parse_args()
+    start_profiling(args)
     
     send_test_notification(args.service_account, args.token, args.topic) 
\ No newline at end of file
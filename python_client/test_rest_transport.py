@@ -0,0 +1,131 @@
+import datetime
+import os
+import uuid
+import pytest
+from rest_transport import FirestoreRestClient, FirestoreRestError, decode_value, encode_value
+
+EMULATOR_HOST = os.environ.get('FIRESTORE_EMULATOR_HOST')
+
+needs_emulator = pytest.mark.skipif(not EMULATOR_HOST,
+                                    reason='FIRESTORE_EMULATOR_HOST is not set')
+
+
+@pytest.mark.parametrize('value', [
+    None,
+    True,
+    False,
+    0,
+    -42,
+    2 ** 62,
+    1.5,
+    '',
+    'pending',
+    b'\x00\xffbytes',
+    datetime.datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+    [1, 'two', None, [3.0]],
+    {'title': 'Laptop', 'amount': 1200, 'tags': ['it'], 'nested': {'ok': True}},
+])
+def test_value_round_trip(value):
+    assert decode_value(encode_value(value)) == value
+
+
+def test_value_encoding():
+    assert encode_value(7) == {'integerValue': '7'}
+    assert encode_value(True) == {'booleanValue': True}
+    assert encode_value((1, 2)) == encode_value([1, 2])
+    assert encode_value(datetime.datetime(2024, 5, 1, 12, 0)) == \
+        {'timestampValue': '2024-05-01T12:00:00.000000Z'}
+
+
+def test_timestamp_decoding_truncates_nanoseconds():
+    decoded = decode_value({'timestampValue': '2024-05-01T12:00:00.123456789Z'})
+    assert decoded == datetime.datetime(2024, 5, 1, 12, 0, 0, 123456,
+                                        tzinfo=datetime.timezone.utc)
+
+
+def test_unsupported_value():
+    with pytest.raises(TypeError):
+        encode_value(object())
+
+
+class _Response:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.text = ''
+
+    def json(self):
+        return {'error': {'message': f"status {self.status_code}"}}
+
+
+def _offline_client(monkeypatch, status_codes):
+    client = FirestoreRestClient('test-project', base_url='http://localhost:1/v1')
+    responses = [_Response(code) for code in status_codes]
+    monkeypatch.setattr(client.session, 'request', lambda *args, **kwargs: responses.pop(0))
+    return client
+
+
+def test_create_document_retried_commit_that_landed(monkeypatch):
+    # The first commit landed but its response was lost; the retry sees 409
+    client = _offline_client(monkeypatch, [503, 409])
+    assert len(client.create_document('approvals', {'status': 'pending'})) == 20
+
+
+def test_create_document_conflict_on_first_attempt(monkeypatch):
+    client = _offline_client(monkeypatch, [409])
+    with pytest.raises(FirestoreRestError):
+        client.create_document('approvals', {'status': 'pending'})
+
+
+@pytest.fixture
+def rest():
+    # A fresh project per test keeps the emulator's data isolated
+    client = FirestoreRestClient(f"test-{uuid.uuid4().hex[:12]}",
+                                 base_url=f"http://{EMULATOR_HOST}/v1")
+    yield client
+    client.close()
+
+
+@needs_emulator
+def test_create_and_get_document(rest):
+    fields = {'title': 'Laptop', 'requesterId': 'alice', 'status': 'pending', 'amount': 1200}
+    request_id = rest.create_document('approvals', fields, server_timestamps=['createdAt'])
+
+    assert len(request_id) == 20
+    data = rest.get_document('approvals', request_id)
+    assert {key: data[key] for key in fields} == fields
+    assert isinstance(data['createdAt'], datetime.datetime)
+
+
+@needs_emulator
+def test_create_document_with_existing_id(rest):
+    request_id = rest.create_document('approvals', {'status': 'pending'}, document_id='fixed-id')
+    with pytest.raises(FirestoreRestError) as error:
+        rest.create_document('approvals', {'status': 'approved'}, document_id=request_id)
+    assert error.value.status_code == 409
+    assert rest.get_document('approvals', request_id)['status'] == 'pending'
+
+
+@needs_emulator
+def test_get_missing_document(rest):
+    assert rest.get_document('approvals', 'does-not-exist') is None
+
+
+@needs_emulator
+def test_run_query(rest):
+    created_at = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+    for i, status in enumerate(['pending', 'approved', 'pending', 'pending']):
+        rest.create_document('approvals', {
+            'status': status,
+            'createdAt': created_at + datetime.timedelta(minutes=i),
+        }, document_id=f"request-{i}")
+
+    rows = rest.run_query('approvals', [('status', '==', 'pending')], order_by='createdAt',
+                          direction='DESCENDING', limit=2)
+    assert [request_id for request_id, _ in rows] == ['request-3', 'request-2']
+    assert all(data['status'] == 'pending' for _, data in rows)
+
+    rows = rest.run_query('approvals', [('status', 'in', ['approved', 'rejected'])])
+    assert [request_id for request_id, _ in rows] == ['request-1']
+
+    assert rest.count('approvals', [('status', '==', 'pending')]) == 3
+    assert rest.run_query('approvals', [('status', '==', 'rejected')]) == []
@@ -2,9 +2,12 @@
 import argparse
 import time
 import sys
+from profiling import add_profile_arguments, start_profiling
 from approval_client import ApprovalClient
+from deadlines import Cancelled, Deadline, DeadlineExceeded
+from sharded_client import ShardedApprovalClient, load_shard_config
 
-def watch_request(client, request_id, interval=5, timeout=300):
+def watch_request(client, request_id, interval=5, timeout=300, deadline=None):
     """
     Watch an existing approval request until its status changes
     
@@ -13,15 +16,28 @@ def watch_request(client, request_id, interval=5, timeout=300):
         request_id: ID of the request to watch
         interval: Polling interval in seconds
         timeout: Maximum time to wait in seconds
+        deadline: Optional Deadline to use instead of timeout; cancelling it
+                  from another thread stops the watch promptly
         
     Returns:
         Final status of the request or None if timed out
     """
+    deadline = deadline or Deadline(timeout)
+    try:
+        return _watch(client, request_id, interval, timeout, deadline)
+    except DeadlineExceeded:
+        print("\n⏰ Timeout reached. Request is still pending.")
+        return 'timeout'
+    except Cancelled:
+        print("\nWatch cancelled.")
+        return 'cancelled'
+
+def _watch(client, request_id, interval, timeout, deadline):
     print(f"Watching request {request_id} for status changes...")
     print(f"Will check every {interval} seconds (timeout after {timeout} seconds)")
     
     # Get initial status
-    initial_status = client.check_request_status(request_id)
+    initial_status = client.check_request_status(request_id, deadline=deadline)
     if initial_status is None:
         print("Request not found. Exiting.")
         return None
@@ -37,7 +53,7 @@ def watch_request(client, request_id, interval=5, timeout=300):
     elapsed = 0
     
     while elapsed < timeout:
-        status = client.check_request_status(request_id)
+        status = client.check_request_status(request_id, deadline=deadline)
         
         if status is None:
             print("Request not found. Exiting.")
@@ -57,7 +73,8 @@ def watch_request(client, request_id, interval=5, timeout=300):
         sys.stdout.write(f"\rWaiting for approval [{bar}] {progress:.1f}% ({elapsed:.0f}s)")
         sys.stdout.flush()
         
-        time.sleep(interval)
+        deadline.wait(interval)
+        deadline.remaining()  # Raises once the deadline passes or the watch is cancelled
         elapsed = time.time() - start_time
     
     print("\n⏰ Timeout reached. Request is still pending.")
@@ -69,16 +86,30 @@ def main():
                         help='Path to Firebase credentials JSON file')
     parser.add_argument('--request-id', required=True,
                         help='ID of the request to watch')
+    parser.add_argument('--hedge', action='store_true',
+                        help='Send a backup read when a status check is unusually slow')
+    parser.add_argument('--transport', choices=['grpc', 'rest'], default='grpc',
+                        help='Talk to Firestore over gRPC or the faster-starting REST API '
+                             '(with --shards, for shards whose config names no transport)')
+    parser.add_argument('--shards',
+                        help='Path to shard configuration JSON file (for sharded request IDs)')
     parser.add_argument('--interval', type=int, default=5,
                         help='Polling interval in seconds')
     parser.add_argument('--timeout', type=int, default=300,
                         help='Maximum time to wait in seconds')
     
+    add_profile_arguments(parser)
     args = parser.parse_args()
+    start_profiling(args)
     
     try:
-        print(f"Initializing client with credentials from: {args.credentials}")
-        client = ApprovalClient(args.credentials)
+        if args.shards:
+            print(f"Initializing sharded client from: {args.shards}")
+            client = ShardedApprovalClient(load_shard_config(args.shards), hedge=args.hedge,
+                                           transport=args.transport)
+        else:
+            print(f"Initializing client with credentials from: {args.credentials}")
+            client = ApprovalClient(args.credentials, hedge=args.hedge, transport=args.transport)
         
         final_status = watch_request(
             client=client,